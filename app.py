@@ -1,17 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy import text
+from datetime import datetime, timedelta
 import models
 import schemas
 import crud
 import auth
-from database import engine, SessionLocal
+import archival
+import payments
+import catalog
+from database import engine, SessionLocal, router
 from sample_data import create_sample_data
-from typing import List, Optional
+from typing import List, Optional, Union
+import asyncio
+import threading
+import signal
 import os
 
 app = FastAPI(title="Travel Booking API", version="1.0.0")
@@ -30,16 +37,89 @@ app.mount("/static", StaticFiles(directory="frontend"), name="static")
 
 # Create tables in database
 models.Base.metadata.create_all(bind=engine)
+models.create_missing_indexes(engine)
 
-# Create sample data on startup
-@app.on_event("startup")
-async def startup_event():
+# Create sample data once at import: with a preloaded multi-worker server this runs
+# in the master before forking instead of racing in every worker
+def init_sample_data():
     db = SessionLocal()
     try:
         create_sample_data(db)
     finally:
         db.close()
 
+init_sample_data()
+
+# Lifecycle reported by /ready: "starting" -> "ready" -> "draining"
+app.state.lifecycle = "starting"
+
+# Seconds to keep serving (with /ready answering 503) after SIGTERM before the
+# server closes its socket; must stay below GRACEFUL_TIMEOUT
+DRAIN_DELAY_SECONDS = float(os.getenv("DRAIN_DELAY_SECONDS", "5"))
+
+def install_drain_handler():
+    """Report not-ready as soon as SIGTERM arrives, then let the server drain as usual.
+
+    The server closes its listening socket as soon as it handles SIGTERM, after
+    which probes get "connection refused" rather than a 503. Passing the signal on
+    after DRAIN_DELAY_SECONDS gives load balancers time to see the 503 first.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return  # Signal handlers can only be installed from the main thread
+    previous = signal.getsignal(signal.SIGTERM)
+    
+    def pass_on(signum, frame):
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            # Default (or no Python-level) handler: restore it and deliver the signal again
+            signal.signal(signum, previous if previous is not None else signal.SIG_DFL)
+            signal.raise_signal(signum)
+    
+    def handle_sigterm(signum, frame):
+        if app.state.lifecycle == "draining" or DRAIN_DELAY_SECONDS <= 0:
+            # Drain delay over, second SIGTERM, or no delay configured: pass it on now
+            app.state.lifecycle = "draining"
+            pass_on(signum, frame)
+            return
+        app.state.lifecycle = "draining"
+        # Re-send the signal after the delay; this handler then passes it on from the
+        # main thread, which is the only one allowed to change signal handlers
+        timer = threading.Timer(DRAIN_DELAY_SECONDS, os.kill, args=(os.getpid(), signum))
+        timer.daemon = True
+        timer.start()
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+# Start per-worker background work (runs in each worker process after fork)
+@app.on_event("startup")
+async def startup_event():
+    # Move departed options and their bookings out of the live tables in the background
+    app.state.archival_task = asyncio.create_task(archival.run_archival_loop())
+    payments.worker_pool.start()
+    if catalog.catalog is not None:
+        # Listen before loading so writes made during the load are journaled and replayed
+        crud.option_listeners.append(catalog.catalog)
+        app.state.catalog_feed = catalog.start_change_feed(engine)
+        if app.state.catalog_feed is not None:
+            crud.option_listeners.append(app.state.catalog_feed)
+        loaded = await asyncio.to_thread(catalog.load_catalog)
+        app.state.catalog_task = asyncio.create_task(catalog.run_refresh_loop())
+        print(f"✅ Columnar catalog loaded with {loaded} travel options")
+    install_drain_handler()
+    app.state.lifecycle = "ready"
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # In-flight requests have finished by now; let running payments settle too
+    app.state.lifecycle = "draining"
+    app.state.archival_task.cancel()
+    if catalog.catalog is not None:
+        app.state.catalog_task.cancel()
+        if app.state.catalog_feed is not None:
+            app.state.catalog_feed.stop()
+    await asyncio.to_thread(payments.worker_pool.stop)
+
 @app.get("/")
 def read_root():
     return FileResponse('frontend/index.html')
@@ -100,8 +180,15 @@ def update_user_profile(
         raise HTTPException(status_code=404, detail="User not found")
     return updated_user
 
+@app.get("/users/me/summary", response_model=schemas.BookingSummary)
+def read_booking_summary(
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(auth.get_db)
+):
+    return crud.get_booking_summary(db, current_user.user_id)
+
 # Travel options endpoints
-@app.get("/travel-options", response_model=List[schemas.TravelOption])
+@app.get("/travel-options", response_model=Union[List[schemas.TravelOption], schemas.TravelOptionSearchResult])
 def get_travel_options(
     skip: int = 0,
     limit: int = 100,
@@ -111,32 +198,58 @@ def get_travel_options(
     date: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    db: Session = Depends(auth.get_db)
+    facets: bool = False,
+    price_bucket_size: int = 1000,
+    db: Session = Depends(auth.get_read_db)
 ):
     from decimal import Decimal
-    if any([type, source, destination, date, min_price, max_price]):
-        # Convert float to Decimal for database queries
-        min_price_decimal = Decimal(str(min_price)) if min_price is not None else None
-        max_price_decimal = Decimal(str(max_price)) if max_price is not None else None
-        
+    if price_bucket_size <= 0:
+        raise HTTPException(status_code=400, detail="price_bucket_size must be greater than 0")
+    
+    # Convert float to Decimal for database queries
+    filters = dict(
+        type=type,
+        source=source,
+        destination=destination,
+        date=date,
+        min_price=Decimal(str(min_price)) if min_price is not None else None,
+        max_price=Decimal(str(max_price)) if max_price is not None else None
+    )
+    # Unfiltered listings include sold-out options, searches only show available ones
+    only_available = any(filters.values())
+    
+    if catalog.catalog is not None and catalog.catalog.ready:
+        # Serve from the in-memory columnar snapshot without touching the database
+        results = catalog.catalog.search(skip=skip, limit=limit, only_available=only_available, **filters)
+        if not facets:
+            return results
+        return {
+            "results": results,
+            "facets": catalog.catalog.facets(price_bucket_size=price_bucket_size, only_available=only_available, **filters)
+        }
+    
+    if only_available:
         # Use search function if any filters are provided
-        return crud.search_travel_options(
-            db=db,
-            type=type,
-            source=source,
-            destination=destination,
-            date=date,
-            min_price=min_price_decimal,
-            max_price=max_price_decimal,
-            skip=skip,
-            limit=limit
-        )
+        results = crud.search_travel_options(db=db, skip=skip, limit=limit, **filters)
     else:
         # Return all travel options
-        return crud.get_travel_options(db=db, skip=skip, limit=limit)
+        results = crud.get_travel_options(db=db, skip=skip, limit=limit)
+    
+    if not facets:
+        return results
+    
+    return {
+        "results": results,
+        "facets": crud.get_search_facets(
+            db=db,
+            only_available=only_available,
+            price_bucket_size=price_bucket_size,
+            **filters
+        )
+    }
 
 @app.get("/travel-options/{option_id}", response_model=schemas.TravelOption)
-def get_travel_option(option_id: int, db: Session = Depends(auth.get_db)):
+def get_travel_option(option_id: int, db: Session = Depends(auth.get_read_db)):
     db_option = crud.get_travel_option(db, option_id=option_id)
     if db_option is None:
         raise HTTPException(status_code=404, detail="Travel option not found")
@@ -163,6 +276,10 @@ def create_booking(
     if not travel_option:
         raise HTTPException(status_code=404, detail="Travel option not found")
     
+    # Departed options are hidden from search and can no longer be booked
+    if travel_option.departure_time < datetime.now():
+        raise HTTPException(status_code=400, detail="This travel option has already departed")
+    
     if travel_option.available_seats < booking.num_seats:
         raise HTTPException(
             status_code=400,
@@ -174,22 +291,37 @@ def create_booking(
     
     db_booking = crud.create_booking(db=db, booking=booking, user_id=current_user.user_id)
     if db_booking is None:
-        raise HTTPException(status_code=400, detail="Failed to create booking")
+        raise HTTPException(status_code=400, detail="Failed to create booking: not enough seats available")
     
+    payments.worker_pool.wake()
     return db_booking
 
 @app.get("/bookings", response_model=List[schemas.Booking])
 def get_user_bookings(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(auth.get_db)
+    db: Session = Depends(auth.get_user_read_db)
 ):
-    return crud.get_user_bookings(db=db, user_id=current_user.user_id)
+    if status_filter is not None and status_filter not in crud.BOOKING_HISTORY_FILTERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"status must be one of: {', '.join(crud.BOOKING_HISTORY_FILTERS)}"
+        )
+    return crud.get_user_bookings(
+        db=db,
+        user_id=current_user.user_id,
+        status_filter=status_filter,
+        skip=skip,
+        limit=limit
+    )
 
 @app.get("/bookings/{booking_id}", response_model=schemas.Booking)
 def get_booking(
     booking_id: int,
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(auth.get_db)
+    db: Session = Depends(auth.get_user_read_db)
 ):
     booking = crud.get_booking(db=db, booking_id=booking_id, user_id=current_user.user_id)
     if booking is None:
@@ -202,7 +334,13 @@ def cancel_booking(
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(auth.get_db)
 ):
-    booking = crud.cancel_booking(db=db, booking_id=booking_id, user_id=current_user.user_id)
+    try:
+        booking = crud.cancel_booking(db=db, booking_id=booking_id, user_id=current_user.user_id)
+    except crud.PaymentInProgress:
+        raise HTTPException(
+            status_code=409,
+            detail="Payment in progress, please try again in a few seconds"
+        )
     if booking is None:
         raise HTTPException(
             status_code=400,
@@ -210,10 +348,33 @@ def cancel_booking(
         )
     return booking
 
+# Payment queue metrics: aggregate counts and latencies only, no user data, so
+# like /health and /ready it is left unauthenticated for monitoring
+@app.get("/payments/stats")
+def get_payment_stats(db: Session = Depends(auth.get_db)):
+    return payments.get_queue_stats(db)
+
+# Readiness endpoint for load balancers: unlike /health it fails while starting,
+# draining or when the database is unreachable
+@app.get("/ready")
+def readiness_check():
+    if app.state.lifecycle != "ready":
+        return JSONResponse(status_code=503, content={"status": app.state.lifecycle, "pid": os.getpid()})
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "pid": os.getpid()})
+    return {"status": "ready", "pid": os.getpid()}
+
 # Health check endpoint
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "message": "Travel Booking API is running"}
+    return {
+        "status": "healthy",
+        "message": "Travel Booking API is running",
+        "replicas": router.status()
+    }
 
 if __name__ == "__main__":
     import uvicorn
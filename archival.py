@@ -0,0 +1,157 @@
+"""
+Archival of departed travel options
+
+Travel options that departed more than ARCHIVE_AFTER_HOURS ago are moved, together
+with their bookings and payments, from the live tables into travel_options_archive,
+bookings_archive and payments_archive. Rows are moved in batches of
+ARCHIVE_BATCH_SIZE options, one transaction per batch, so the live tables are never
+locked for long.
+
+Options that still have unsettled bookings (anything not in SETTLED_BOOKING_STATUSES)
+are left in place until they settle.
+
+SQLite databases created before the live tables used AUTOINCREMENT may have reused
+the id of an archived row. There, options whose own, booking or payment ids already exist
+in the archive are left in place (and reported) instead of failing every batch.
+"""
+
+from sqlalchemy import select, insert, delete, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from database import SessionLocal
+import models
+import crud
+import asyncio
+import os
+
+ARCHIVE_AFTER_HOURS = int(os.getenv("ARCHIVE_AFTER_HOURS", "24"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_LOCK_KEY = 7242001  # Postgres advisory lock id shared by all archival runners
+
+# "Pending" bookings still have a payment in flight and are never archived
+SETTLED_BOOKING_STATUSES = ("Confirmed", "Cancelled", "Failed")
+
+_OPTION_COLUMNS = [c.name for c in models.TravelOption.__table__.columns]
+_BOOKING_COLUMNS = [c.name for c in models.Booking.__table__.columns]
+_PAYMENT_COLUMNS = [c.name for c in models.Payment.__table__.columns]
+
+
+def archive_departed_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """Move one batch of options departed before `cutoff`. Returns the number of options moved."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Every app worker runs the archival loop; only one of them moves rows at a time
+        locked = db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": ARCHIVE_LOCK_KEY}).scalar()
+        if not locked:
+            db.rollback()
+            return 0
+
+    unsettled = select(models.Booking.option_id).where(
+        models.Booking.status.notin_(SETTLED_BOOKING_STATUSES)
+    )
+    query = db.query(models.TravelOption.option_id).filter(
+        models.TravelOption.departure_time < cutoff,
+        models.TravelOption.option_id.notin_(unsettled)
+    )
+    if db.get_bind().dialect.name == "sqlite":
+        query = query.filter(models.TravelOption.option_id.notin_(_reused_id_options()))
+    option_ids = [
+        row.option_id
+        for row in query.order_by(models.TravelOption.departure_time).limit(batch_size)
+    ]
+    if not option_ids:
+        return 0
+
+    options = models.TravelOption.__table__
+    bookings = models.Booking.__table__
+    payments = models.Payment.__table__
+    jobs = models.PaymentJob.__table__
+    booking_ids = select(bookings.c.booking_id).where(bookings.c.option_id.in_(option_ids))
+    payment_ids = select(payments.c.payment_id).where(payments.c.booking_id.in_(booking_ids))
+
+    db.execute(
+        insert(models.ArchivedTravelOption.__table__).from_select(
+            _OPTION_COLUMNS,
+            select(*[options.c[name] for name in _OPTION_COLUMNS]).where(options.c.option_id.in_(option_ids))
+        )
+    )
+    db.execute(
+        insert(models.ArchivedBooking.__table__).from_select(
+            _BOOKING_COLUMNS,
+            select(*[bookings.c[name] for name in _BOOKING_COLUMNS]).where(bookings.c.option_id.in_(option_ids))
+        )
+    )
+    db.execute(
+        insert(models.ArchivedPayment.__table__).from_select(
+            _PAYMENT_COLUMNS,
+            select(*[payments.c[name] for name in _PAYMENT_COLUMNS]).where(payments.c.booking_id.in_(booking_ids))
+        )
+    )
+    # Jobs of settled bookings are finished; the payment rows themselves are kept in the archive
+    db.execute(delete(jobs).where(jobs.c.payment_id.in_(payment_ids)))
+    db.execute(delete(payments).where(payments.c.booking_id.in_(booking_ids)))
+    db.execute(delete(bookings).where(bookings.c.option_id.in_(option_ids)))
+    db.execute(delete(options).where(options.c.option_id.in_(option_ids)))
+    db.commit()
+    crud.notify_options_removed(option_ids)
+    return len(option_ids)
+
+
+def _reused_id_options():
+    """Option ids that can't be archived because an id of theirs is already taken in the archive."""
+    options = select(models.TravelOption.option_id).join(
+        models.ArchivedTravelOption, models.ArchivedTravelOption.option_id == models.TravelOption.option_id
+    )
+    bookings = select(models.Booking.option_id).join(
+        models.ArchivedBooking, models.ArchivedBooking.booking_id == models.Booking.booking_id
+    )
+    payments = select(models.Booking.option_id).join(models.Booking.payment).join(
+        models.ArchivedPayment, models.ArchivedPayment.payment_id == models.Payment.payment_id
+    )
+    return options.union(bookings, payments)
+
+
+def count_reused_id_options(db: Session, cutoff: datetime):
+    """Departed options held back by _reused_id_options, for reporting."""
+    if db.get_bind().dialect.name != "sqlite":
+        return 0  # PostgreSQL sequences never hand out an id twice
+    return db.query(models.TravelOption.option_id).filter(
+        models.TravelOption.departure_time < cutoff,
+        models.TravelOption.option_id.in_(_reused_id_options())
+    ).count()
+
+
+def archive_departed_options(db: Session, before: datetime = None, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """Archive every option departed before `before` (default: ARCHIVE_AFTER_HOURS ago)."""
+    cutoff = before or datetime.now() - timedelta(hours=ARCHIVE_AFTER_HOURS)
+    total = 0
+    while True:
+        moved = archive_departed_batch(db, cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def _archive_once():
+    db = SessionLocal()
+    try:
+        archived = archive_departed_options(db)
+        cutoff = datetime.now() - timedelta(hours=ARCHIVE_AFTER_HOURS)
+        skipped = count_reused_id_options(db, cutoff)
+        if skipped:
+            print(f"⚠️  {skipped} departed travel options not archived: their ids already exist in the archive")
+        return archived
+    finally:
+        db.close()
+
+
+async def run_archival_loop(interval: int = ARCHIVE_INTERVAL_SECONDS):
+    """Background task started by the app: archive departed options every `interval` seconds."""
+    while True:
+        try:
+            archived = await asyncio.to_thread(_archive_once)
+            if archived:
+                print(f"📦 Archived {archived} departed travel options")
+        except Exception as e:
+            print(f"❌ Archival run failed: {e}")
+        await asyncio.sleep(interval)
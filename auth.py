@@ -5,7 +5,7 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import SessionLocal, ReadSessionLocal, router
 import models
 import os
 
@@ -51,7 +51,16 @@ def get_db():
     finally:
         db.close()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Plain def: the user lookup is a blocking query, so it must run in the threadpool
+# rather than on the event loop (where a full connection pool would stall the server)
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -68,3 +77,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     if user is None:
         raise credentials_exception
     return user
+
+def get_user_read_db(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Users who just booked read from the primary so they see their own writes
+    read_engine = router.read_engine(current_user.user_id)
+    if read_engine is router.primary:
+        # Reuse the request's primary session; holding two connections from the
+        # primary pool per request can exhaust it under concurrency
+        yield db
+        return
+    read_db = SessionLocal(bind=read_engine)
+    try:
+        yield read_db
+    finally:
+        read_db.close()
@@ -0,0 +1,122 @@
+"""
+Benchmark: SQL search vs the in-memory columnar catalog
+
+Fills a separate database with synthetic travel options, then compares memory per
+option and query latency of crud.search_travel_options / crud.get_search_facets
+against catalog.ColumnarCatalog.
+
+To run:
+    python bench_catalog.py [num_options]
+
+Set BENCH_DSN to benchmark against PostgreSQL instead of a local SQLite file.
+"""
+
+import sys
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import models
+import crud
+from catalog import ColumnarCatalog
+
+BENCH_DSN = os.getenv("BENCH_DSN", "sqlite:///./bench_catalog.db")
+
+CITIES = ["Mumbai", "Delhi", "Bangalore", "Chennai", "Kolkata", "Hyderabad", "Pune",
+          "Ahmedabad", "Jaipur", "Lucknow", "Goa", "Kochi", "Chandigarh", "Indore"]
+TYPES = ["Flight", "Train", "Bus"]
+
+QUERIES = [
+    {},
+    {"type": "Flight"},
+    {"source": "Mumbai", "destination": "Delhi"},
+    {"date": (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")},
+    {"type": "bus", "min_price": Decimal("500"), "max_price": Decimal("2000")},
+]
+
+
+def populate(db, num_options):
+    existing = db.query(models.TravelOption).count()
+    if existing >= num_options:
+        return
+    now = datetime.now()
+    batch = []
+    for i in range(existing, num_options):
+        source, destination = random.sample(CITIES, 2)
+        departure = now + timedelta(minutes=random.randint(60, 90 * 24 * 60))
+        batch.append({
+            "title": f"{random.choice(TYPES)} {i}",
+            "type": random.choice(TYPES),
+            "source": source,
+            "destination": destination,
+            "departure_time": departure,
+            "arrival_time": departure + timedelta(hours=random.randint(1, 30)),
+            "price_per_seat": Decimal(random.randint(50000, 1500000)) / 100,
+            "available_seats": random.randint(0, 300),
+        })
+        if len(batch) == 10000:
+            db.execute(insert(models.TravelOption.__table__), batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.TravelOption.__table__), batch)
+    db.commit()
+
+
+def timed(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def orm_bytes_per_option(db, sample=10000):
+    tracemalloc.start()
+    options = db.query(models.TravelOption).limit(sample).all()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / max(len(options), 1)
+
+
+def run_benchmark(num_options):
+    engine = create_engine(BENCH_DSN)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        print(f"Preparing {num_options} travel options in {BENCH_DSN}...")
+        populate(db, num_options)
+
+        catalog = ColumnarCatalog()
+        start = time.perf_counter()
+        loaded = catalog.load(db)
+        print(f"Columnar snapshot loaded {loaded} options in {time.perf_counter() - start:.2f}s")
+
+        print("\nMemory per option")
+        print(f"  ORM objects: {orm_bytes_per_option(db):8.0f} bytes")
+        print(f"  Columnar:    {catalog.memory_bytes() / max(loaded, 1):8.0f} bytes")
+
+        print("\nMedian latency (ms)              SQL search  columnar  SQL facets  columnar facets")
+        for filters in QUERIES:
+            db.expunge_all()
+            sql_search = timed(lambda: crud.search_travel_options(db, limit=100, **filters), repeat=5)
+            sql_facets = timed(lambda: crud.get_search_facets(db, **filters), repeat=5)
+            col_search = timed(lambda: catalog.search(limit=100, **filters))
+            col_facets = timed(lambda: catalog.facets(**filters))
+            label = ", ".join(f"{key}={value}" for key, value in filters.items()) or "(no filters)"
+            print(f"  {label[:30]:30} {sql_search:10.2f} {col_search:9.2f} {sql_facets:11.2f} {col_facets:16.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,159 @@
+"""
+Benchmark: throughput of the production server from 1 to N workers
+
+For each worker count this starts `gunicorn app:app -c gunicorn_conf.py` on a
+free port, waits for /ready, and drives two request mixes with concurrent clients:
+
+- search:  GET /travel-options with random filters
+- booking: POST /bookings for one seat, then GET /bookings
+
+To run:
+    python bench_server.py [max_workers] [seconds_per_mix] [clients]
+
+Point POSTGRES_DSN at a PostgreSQL database for meaningful booking numbers;
+concurrent writers on the SQLite fallback serialize on its file lock.
+"""
+
+import sys
+import os
+import json
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from gunicorn_conf import available_cpus
+
+CITIES = ["Mumbai", "Delhi", "Bangalore", "Chennai", "Kolkata", "Pune"]
+TYPES = ["Flight", "Train", "Bus"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(base_url, method, path, body=None, token=None, form=False):
+    headers = {}
+    data = None
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if body is not None:
+        if form:
+            data = urllib.parse.urlencode(body).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        else:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    with urllib.request.urlopen(req, timeout=30) as response:
+        return json.loads(response.read() or b"null")
+
+
+def start_server(workers, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    server = subprocess.Popen(
+        ["gunicorn", "app:app", "-c", "gunicorn_conf.py", "--access-logfile", "/dev/null"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            request(base_url, "GET", "/ready")
+            return server, base_url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("Server did not become ready")
+
+
+def setup(base_url):
+    """Register a user and create an option with enough seats for the booking mix."""
+    username = f"bench_{random.randint(0, 10**9)}"
+    request(base_url, "POST", "/register", {"username": username, "email": f"{username}@example.com", "password": "bench"})
+    token = request(base_url, "POST", "/token", {"username": username, "password": "bench"}, form=True)["access_token"]
+    departure = datetime.now() + timedelta(days=30)
+    option = request(base_url, "POST", "/travel-options", {
+        "title": "Benchmark Express",
+        "type": "Train",
+        "source": "Mumbai",
+        "destination": "Delhi",
+        "departure_time": departure.isoformat(),
+        "arrival_time": (departure + timedelta(hours=16)).isoformat(),
+        "price_per_seat": "1000.00",
+        "available_seats": 10**7
+    }, token=token)
+    return token, option["option_id"]
+
+
+def search_mix(base_url, token, option_id):
+    params = {"type": random.choice(TYPES), "source": random.choice(CITIES)}
+    request(base_url, "GET", "/travel-options?" + urllib.parse.urlencode(params))
+
+
+def booking_mix(base_url, token, option_id):
+    request(base_url, "POST", "/bookings", {"option_id": option_id, "num_seats": 1}, token=token)
+    request(base_url, "GET", "/bookings", token=token)
+
+
+def drive(mix, base_url, token, option_id, seconds, clients):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def client():
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                mix(base_url, token, option_id)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    with ThreadPoolExecutor(clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / seconds,
+        "p50": statistics.median(latencies) if latencies else 0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        "errors": errors[0]
+    }
+
+
+def run_benchmark(max_workers, seconds, clients):
+    worker_counts = sorted({1, 2, 4, max_workers} & set(range(1, max_workers + 1)))
+    print(f"{'workers':>7} {'mix':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    for workers in worker_counts:
+        server, base_url = start_server(workers, free_port())
+        try:
+            token, option_id = setup(base_url)
+            for name, mix in (("search", search_mix), ("booking", booking_mix)):
+                result = drive(mix, base_url, token, option_id, seconds, clients)
+                print(f"{workers:>7} {name:>8} {result['rps']:>9.1f} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['errors']:>7}")
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else available_cpus(),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    )
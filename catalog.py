@@ -0,0 +1,605 @@
+"""
+In-memory columnar snapshot of travel_options for the GET /travel-options read path
+
+Enabled with CATALOG_ENGINE=columnar (requires numpy). Each option is stored as one
+row across typed arrays:
+
+- option_id, departure/arrival epochs (int64), price in paise (int64)
+- seats (int32), interned title/city codes (int32), type code (int16)
+- departure hour (int8) for the time-of-day facet
+- a combined (type, hour, price bucket) facet key (int32)
+
+The main segment is sorted by departure so date and "not yet departed" bounds are
+binary searches; every other filter is a vectorized mask over that slice. Newly
+created options go to a small unsorted tail segment that is merged into the main
+segment once it exceeds CATALOG_MERGE_THRESHOLD rows.
+
+crud notifies the catalog after every committed write (option_changed,
+seats_changed, options_removed). Notifications carry option ids only: a background
+thread re-reads those rows from the primary, batching ids queued in the meantime,
+so applying a change twice is harmless and writers never wait on it.
+On PostgreSQL the notifications are also shared with the other server processes
+through LISTEN/NOTIFY (ChangeFeed); on SQLite each process only sees its own
+writes, so run a single worker there. The whole snapshot is rebuilt every
+CATALOG_REFRESH_SECONDS as a safety net.
+"""
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
+from database import SessionLocal
+import models
+import asyncio
+import calendar
+import json
+import select as io_select
+import threading
+import time
+import os
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for CATALOG_ENGINE=columnar
+    np = None
+
+CATALOG_ENGINE = os.getenv("CATALOG_ENGINE", "sql")
+CATALOG_MERGE_THRESHOLD = int(os.getenv("CATALOG_MERGE_THRESHOLD", "1024"))
+CATALOG_REFRESH_SECONDS = int(os.getenv("CATALOG_REFRESH_SECONDS", "600"))
+# Finest price histogram width (rupees) precomputed for facets; multiples of it are folded
+CATALOG_PRICE_BUCKET = int(os.getenv("CATALOG_PRICE_BUCKET", "500"))
+
+_EPOCH = datetime(1970, 1, 1)
+
+_COLUMN_TYPES = {
+    "option_id": "int64",
+    "title": "int32",
+    "type": "int16",
+    "source": "int32",
+    "destination": "int32",
+    "departure": "int64",
+    "arrival": "int64",
+    "price": "int64",
+    "seats": "int32",
+    "hour": "int8",
+    "alive": "bool",
+}
+
+# Attributes that make up one snapshot; load() builds them aside and swaps them in
+_SNAPSHOT_ATTRIBUTES = ("titles", "types", "cities", "_main", "_ids_sorted", "_ids_rows", "_tail", "_tail_rows")
+
+# Departure hour ranges [start, end) for the time-of-day facet, same as crud.get_search_facets
+TIME_OF_DAY_BUCKETS = (
+    ("night", 0, 6),
+    ("morning", 6, 12),
+    ("afternoon", 12, 18),
+    ("evening", 18, 24),
+)
+
+
+def _to_epoch(value: datetime):
+    # Naive datetimes are stored as-is, so treat them as UTC consistently both ways
+    return calendar.timegm(value.timetuple())
+
+
+def _from_epoch(value):
+    return _EPOCH + timedelta(seconds=int(value))
+
+
+def _to_paise(price):
+    return int((Decimal(price) * 100).to_integral_value())
+
+
+class StringPool:
+    """Interns strings to small integer codes."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value: str):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def matching(self, needle: str):
+        """Codes whose value contains `needle`, case-insensitively (same as ILIKE '%needle%')."""
+        needle = needle.lower()
+        return np.array([code for code, value in enumerate(self.values) if needle in value.lower()], dtype="int32")
+
+
+class ColumnarCatalog:
+    def __init__(self):
+        self.ready = False
+        self._lock = threading.RLock()
+        # Serializes "read rows from the database, apply them" so a later read is
+        # never overwritten by an earlier one
+        self._refresh_lock = threading.Lock()
+        self._journal = None
+        # Option ids waiting to be re-read by the applier thread
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._pending_ready = threading.Event()
+        self._applier = None
+        self._reset()
+
+    def _reset(self):
+        self.titles = StringPool()
+        self.types = StringPool()
+        self.cities = StringPool()
+        self._main = self._segment({name: [] for name in _COLUMN_TYPES})
+        self._ids_sorted = np.empty(0, dtype="int64")
+        self._ids_rows = np.empty(0, dtype="int64")
+        self._tail = []
+        self._tail_rows = {}
+
+    # Loading
+
+    def _encode(self, option_id, title, type, source, destination, departure_time, arrival_time, price_per_seat, available_seats):
+        departure = _to_epoch(departure_time)
+        return (
+            option_id,
+            self.titles.code(title),
+            self.types.code(type),
+            self.cities.code(source),
+            self.cities.code(destination),
+            departure,
+            _to_epoch(arrival_time),
+            _to_paise(price_per_seat),
+            available_seats,
+            (departure // 3600) % 24,
+            True,
+        )
+
+    def _segment(self, columns):
+        """Typed arrays sorted by departure, plus the combined facet key.
+
+        The facet key packs (type, departure hour, price bucket of CATALOG_PRICE_BUCKET)
+        into one integer so all three facets come from a single bincount.
+        """
+        segment = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in _COLUMN_TYPES.items()}
+        order = np.argsort(segment["departure"], kind="stable")
+        segment = {name: values[order] for name, values in segment.items()}
+
+        price_buckets = segment["price"] // (CATALOG_PRICE_BUCKET * 100)
+        shape = (
+            len(self.types.values),
+            24,
+            int(price_buckets.max()) + 1 if len(price_buckets) else 1,
+        )
+        segment["facet"] = (
+            (segment["type"].astype("int32") * 24 + segment["hour"]) * shape[2] + price_buckets
+        ).astype("int32")
+        segment["facet_shape"] = shape
+        return segment
+
+    def _build_main(self, columns):
+        self._main = self._segment(columns)
+        self._ids_rows = np.argsort(self._main["option_id"])
+        self._ids_sorted = self._main["option_id"][self._ids_rows]
+
+    @staticmethod
+    def _rows_query():
+        options = models.TravelOption.__table__
+        return select(
+            options.c.option_id, options.c.title, options.c.type, options.c.source,
+            options.c.destination, options.c.departure_time, options.c.arrival_time,
+            options.c.price_per_seat, options.c.available_seats
+        )
+
+    def load(self, db: Session):
+        """Rebuild the snapshot from the database, then re-read options changed while loading.
+
+        The new snapshot is built aside, so searches keep using the old one until
+        the swap instead of waiting for the whole rebuild.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            fresh = ColumnarCatalog()
+            encoded = []
+            result = db.execute(self._rows_query())
+            # Fetched in chunks: one fetch of every row holds the GIL long enough to stall searches
+            while rows := result.fetchmany(10000):
+                encoded.extend(fresh._encode(*row) for row in rows)
+            fresh._build_main(dict(zip(_COLUMN_TYPES, zip(*encoded))) if encoded else {name: [] for name in _COLUMN_TYPES})
+
+            with self._refresh_lock:
+                with self._lock:
+                    for name in _SNAPSHOT_ATTRIBUTES:
+                        setattr(self, name, getattr(fresh, name))
+                    journal, self._journal = self._journal, None
+                    self.ready = True
+                # The snapshot may or may not include a journaled change; re-reading
+                # those options gives their current state either way
+                changed = set()
+                for event, option_ids in journal:
+                    if event == "removed":
+                        self.options_removed(option_ids)
+                    changed.update(option_ids)
+                self._refresh_rows(db, changed)
+        finally:
+            with self._lock:
+                self._journal = None
+        return len(encoded)
+
+    def _refresh_rows(self, db: Session, option_ids):
+        """Replace the given options with their current rows; call with _refresh_lock held."""
+        if not option_ids:
+            return
+        option_ids = list(option_ids)
+        rows = db.execute(self._rows_query().where(
+            models.TravelOption.__table__.c.option_id.in_(option_ids)
+        )).all()
+        with self._lock:
+            for row in rows:
+                self._upsert(row)
+            missing = set(option_ids) - {row[0] for row in rows}
+            if missing:
+                self.options_removed(missing)
+
+    def _merge_tail(self):
+        alive = self._main["alive"]
+        tail = list(zip(*self._tail))
+        self._build_main({
+            name: np.concatenate([self._main[name][alive], np.asarray(tail[i], dtype=_COLUMN_TYPES[name])])
+            for i, name in enumerate(_COLUMN_TYPES)
+        })
+        self._tail = []
+        self._tail_rows = {}
+
+    # Change notifications (called by crud after commit)
+
+    def _main_row(self, option_id):
+        pos = np.searchsorted(self._ids_sorted, option_id)
+        if pos < len(self._ids_sorted) and self._ids_sorted[pos] == option_id:
+            row = self._ids_rows[pos]
+            if self._main["alive"][row]:
+                return row
+        return None
+
+    def option_changed(self, option: models.TravelOption):
+        self.options_changed([option.option_id])
+
+    def seats_changed(self, option_id: int):
+        self.options_changed([option_id])
+
+    def options_changed(self, option_ids):
+        """Queue the given options to be re-read from the primary by the applier thread.
+
+        The writing request returns without waiting on the database; the applier
+        re-reads everything queued since its last pass in one query.
+        """
+        with self._lock:
+            if self._journal is not None:
+                # A load is in progress: its snapshot may predate this change
+                self._journal.append(("changed", list(option_ids)))
+        with self._pending_lock:
+            self._pending.update(option_ids)
+            if self._applier is None or not self._applier.is_alive():
+                # Started lazily: threads don't survive the fork into server workers
+                self._applier = threading.Thread(target=self._apply_pending, name="catalog-applier", daemon=True)
+                self._applier.start()
+        self._pending_ready.set()
+
+    def _apply_pending(self):
+        while True:
+            self._pending_ready.wait()
+            with self._pending_lock:
+                option_ids, self._pending = self._pending, set()
+                self._pending_ready.clear()
+            if not option_ids:
+                continue
+            db = SessionLocal()
+            try:
+                with self._refresh_lock:
+                    self._refresh_rows(db, option_ids)
+            except Exception as e:
+                print(f"❌ Catalog update failed: {e}")
+                # Retry shortly; the periodic reload is the backstop if this keeps failing
+                with self._pending_lock:
+                    self._pending.update(option_ids)
+                time.sleep(1)
+                self._pending_ready.set()
+            finally:
+                db.close()
+
+    def _upsert(self, values):
+        with self._lock:
+            option_id = values[0]
+            encoded = self._encode(*values)
+            row = self._main_row(option_id)
+            if row is not None:
+                if all(self._main[name][row] == encoded[i] for i, name in enumerate(_COLUMN_TYPES) if name != "seats"):
+                    # Only the seat count changed (bookings): update in place
+                    self._main["seats"][row] = encoded[8]
+                    return
+                self._main["alive"][row] = False
+            if option_id in self._tail_rows:
+                self._tail[self._tail_rows[option_id]] = encoded
+            else:
+                self._tail_rows[option_id] = len(self._tail)
+                self._tail.append(encoded)
+            if len(self._tail) > CATALOG_MERGE_THRESHOLD:
+                self._merge_tail()
+
+    def options_removed(self, option_ids):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("removed", list(option_ids)))
+            for option_id in option_ids:
+                row = self._main_row(option_id)
+                if row is not None:
+                    self._main["alive"][row] = False
+            removed = set(option_ids) & set(self._tail_rows)
+            if removed:
+                self._tail = [row for row in self._tail if row[0] not in removed]
+                self._tail_rows = {row[0]: i for i, row in enumerate(self._tail)}
+
+    # Queries
+
+    @staticmethod
+    def _code_mask(column, pool, needle):
+        codes = pool.matching(needle)
+        if len(codes) == 1:
+            return column == codes[0]
+        # Lookup table instead of np.isin: one gather over the column
+        lookup = np.zeros(len(pool.values), dtype=bool)
+        lookup[codes] = True
+        return lookup[column]
+
+    def _select(self, segment, type=None, source=None, destination=None, date=None,
+                min_price=None, max_price=None, only_available=True, include_departed=False):
+        """Return (lo, mask) where mask selects matching rows of segment[...][lo:lo + len(mask)]."""
+        departure = segment["departure"]
+        start = None if include_departed else _to_epoch(datetime.now())
+        end = None
+        if date:
+            try:
+                day = _to_epoch(datetime.strptime(date, "%Y-%m-%d"))
+                start = max(start or day, day)
+                end = day + 86400
+            except ValueError:
+                pass  # Invalid date format, ignore filter
+
+        lo = 0 if start is None else int(np.searchsorted(departure, start, side="left"))
+        hi = len(departure) if end is None else int(np.searchsorted(departure, end, side="left"))
+        hi = max(lo, hi)
+        mask = segment["alive"][lo:hi].copy()
+
+        if type:
+            mask &= self._code_mask(segment["type"][lo:hi], self.types, type)
+        if source:
+            mask &= self._code_mask(segment["source"][lo:hi], self.cities, source)
+        if destination:
+            mask &= self._code_mask(segment["destination"][lo:hi], self.cities, destination)
+        if min_price is not None:
+            mask &= segment["price"][lo:hi] >= int((Decimal(min_price) * 100).to_integral_value(ROUND_CEILING))
+        if max_price is not None:
+            mask &= segment["price"][lo:hi] <= int((Decimal(max_price) * 100).to_integral_value(ROUND_FLOOR))
+        if only_available:
+            mask &= segment["seats"][lo:hi] > 0
+        return lo, mask
+
+    def _segments(self):
+        """Main segment plus the tail converted to a segment."""
+        segments = [self._main]
+        if self._tail:
+            segments.append(self._segment(dict(zip(_COLUMN_TYPES, zip(*self._tail)))))
+        return segments
+
+    def _row(self, segment, i):
+        return {
+            "option_id": int(segment["option_id"][i]),
+            "title": self.titles.values[segment["title"][i]],
+            "type": self.types.values[segment["type"][i]],
+            "source": self.cities.values[segment["source"][i]],
+            "destination": self.cities.values[segment["destination"][i]],
+            "departure_time": _from_epoch(segment["departure"][i]),
+            "arrival_time": _from_epoch(segment["arrival"][i]),
+            "price_per_seat": Decimal(int(segment["price"][i])).scaleb(-2),
+            "available_seats": int(segment["seats"][i]),
+        }
+
+    def search(self, skip: int = 0, limit: int = 100, **filters):
+        """Matching options ordered by departure time, as dicts shaped like schemas.TravelOption."""
+        with self._lock:
+            candidates = []
+            for segment in self._segments():
+                lo, mask = self._select(segment, **filters)
+                # Only the first skip + limit matches of each sorted segment can make the page
+                for i in np.flatnonzero(mask)[:skip + limit] + lo:
+                    candidates.append((segment["departure"][i], segment, i))
+            candidates.sort(key=lambda candidate: candidate[0])
+            return [self._row(segment, i) for _, segment, i in candidates[skip:skip + limit]]
+
+    def facets(self, price_bucket_size: int = 1000, **filters):
+        """Same result shape as crud.get_search_facets, from one bincount of the facet key."""
+        with self._lock:
+            type_counts = np.zeros(len(self.types.values), dtype="int64")
+            hour_counts = np.zeros(24, dtype="int64")
+            price_counts = {}
+            for segment in self._segments():
+                lo, mask = self._select(segment, **filters)
+                hi = lo + len(mask)
+                shape = segment["facet_shape"]
+                counts = np.bincount(
+                    np.compress(mask, segment["facet"][lo:hi]),
+                    minlength=shape[0] * shape[1] * shape[2]
+                ).reshape(shape)
+                type_counts[:shape[0]] += counts.sum(axis=(1, 2))
+                hour_counts += counts.sum(axis=(0, 2))
+
+                if price_bucket_size % CATALOG_PRICE_BUCKET == 0:
+                    # Fold the precomputed fine buckets into the requested width
+                    fine = counts.sum(axis=(0, 1))
+                    buckets = np.arange(len(fine)) * CATALOG_PRICE_BUCKET // price_bucket_size
+                    folded = np.bincount(buckets, weights=fine).astype("int64")
+                else:
+                    folded = np.bincount(np.compress(mask, segment["price"][lo:hi]) // (price_bucket_size * 100))
+                for bucket in np.flatnonzero(folded):
+                    price_counts[int(bucket)] = price_counts.get(int(bucket), 0) + int(folded[bucket])
+
+            return {
+                "total": int(type_counts.sum()),
+                "types": {
+                    self.types.values[code]: int(count)
+                    for code, count in enumerate(type_counts) if count
+                },
+                "price_histogram": [
+                    {
+                        "min_price": bucket * price_bucket_size,
+                        "max_price": (bucket + 1) * price_bucket_size,
+                        "count": price_counts[bucket]
+                    }
+                    for bucket in sorted(price_counts)
+                ],
+                "departure_times": {
+                    name: int(hour_counts[start:end].sum())
+                    for name, start, end in TIME_OF_DAY_BUCKETS
+                }
+            }
+
+    def __len__(self):
+        with self._lock:
+            return int(self._main["alive"].sum()) + len(self._tail)
+
+    def memory_bytes(self):
+        """Approximate snapshot size: column arrays plus interned strings."""
+        with self._lock:
+            arrays = sum(self._main[name].nbytes for name in list(_COLUMN_TYPES) + ["facet"])
+            arrays += self._ids_sorted.nbytes + self._ids_rows.nbytes
+            strings = sum(
+                len(value.encode()) + 49
+                for pool in (self.titles, self.types, self.cities)
+                for value in pool.values
+            )
+            return arrays + strings
+
+
+def load_catalog():
+    # Load from the primary: change notifications come from primary writes, so a
+    # lagging replica snapshot could miss writes that were never journaled
+    db = SessionLocal()
+    try:
+        return catalog.load(db)
+    finally:
+        db.close()
+
+
+async def run_refresh_loop(interval: int = CATALOG_REFRESH_SECONDS):
+    """Background task started by the app: periodically rebuild the snapshot."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(load_catalog)
+        except Exception as e:
+            print(f"❌ Catalog refresh failed: {e}")
+
+
+class ChangeFeed:
+    """Shares catalog change notifications between server processes (PostgreSQL only).
+
+    Registered as a crud listener, it publishes every local change with pg_notify;
+    a background thread LISTENs on a dedicated connection and applies the other
+    processes' changes to this process's catalog. Notifications missed while the
+    connection was down are covered by a full reload after reconnecting.
+    """
+
+    CHANNEL = "travel_option_changes"
+    # NOTIFY payloads are limited to 8000 bytes
+    MAX_IDS_PER_NOTIFY = 500
+
+    def __init__(self, engine, target: ColumnarCatalog):
+        self.engine = engine
+        self.target = target
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Publishing (called by crud after commit)
+
+    def option_changed(self, option: models.TravelOption):
+        self._publish("changed", [option.option_id])
+
+    def seats_changed(self, option_id: int):
+        self._publish("changed", [option_id])
+
+    def options_removed(self, option_ids):
+        self._publish("removed", list(option_ids))
+
+    def _publish(self, event, option_ids):
+        with self.engine.begin() as conn:
+            for i in range(0, len(option_ids), self.MAX_IDS_PER_NOTIFY):
+                payload = json.dumps({"pid": os.getpid(), "event": event, "ids": option_ids[i:i + self.MAX_IDS_PER_NOTIFY]})
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.CHANNEL, "payload": payload})
+
+    # Listening
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _apply(self, payload):
+        message = json.loads(payload)
+        if message["pid"] == os.getpid():
+            return  # Already applied when this process made the change
+        if message["event"] == "removed":
+            self.target.options_removed(message["ids"])
+        else:
+            self.target.options_changed(message["ids"])
+
+    def _run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            raw = None
+            try:
+                # Detached from the pool: this connection is held for the life of the thread
+                raw = self.engine.raw_connection()
+                raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {self.CHANNEL}")
+                if connected_before:
+                    load_catalog()
+                connected_before = True
+                while not self._stop.is_set():
+                    if io_select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._apply(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"❌ Catalog change feed error: {e}")
+                time.sleep(5)
+            finally:
+                if raw is not None:
+                    raw.close()
+
+
+def start_change_feed(engine):
+    """Share catalog changes with other server processes when the database supports it."""
+    if catalog is None or engine.dialect.name != "postgresql":
+        return None
+    feed = ChangeFeed(engine, catalog)
+    feed.start()
+    return feed
+
+
+def columnar_enabled():
+    if CATALOG_ENGINE != "columnar":
+        return False
+    if np is None:
+        print("❌ CATALOG_ENGINE=columnar needs numpy (pip install numpy); using SQL search")
+        return False
+    return True
+
+
+catalog = ColumnarCatalog() if columnar_enabled() else None
@@ -1,12 +1,35 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, cast, Date
-from datetime import datetime, date
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, func, cast, extract, select, literal, union_all, Integer
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, date, timedelta
 import models
 import schemas
 from auth import get_password_hash
+from database import router
 from typing import Optional, List
 from decimal import Decimal
 
+# Listeners notified after travel option writes commit. Each listener implements
+# option_changed(option), seats_changed(option_id) and options_removed(option_ids)
+option_listeners = []
+
+def _notify(event: str, *args):
+    for listener in option_listeners:
+        try:
+            getattr(listener, event)(*args)
+        except Exception as e:
+            # The write is already committed; a stale listener must not fail the request
+            print(f"❌ Travel option listener failed on {event}: {e}")
+
+def notify_option_changed(option: models.TravelOption):
+    _notify("option_changed", option)
+
+def notify_seats_changed(option_id: int):
+    _notify("seats_changed", option_id)
+
+def notify_options_removed(option_ids: List[int]):
+    _notify("options_removed", option_ids)
+
 # User CRUD operations
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.user_id == user_id).first()
@@ -42,8 +65,11 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
     return db_user
 
 # Travel Option CRUD operations
-def get_travel_options(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.TravelOption).offset(skip).limit(limit).all()
+def get_travel_options(db: Session, skip: int = 0, limit: int = 100, include_departed: bool = False):
+    query = db.query(models.TravelOption)
+    if not include_departed:
+        query = query.filter(models.TravelOption.departure_time >= datetime.now())
+    return query.offset(skip).limit(limit).all()
 
 def get_travel_option(db: Session, option_id: int):
     return db.query(models.TravelOption).filter(models.TravelOption.option_id == option_id).first()
@@ -53,20 +79,22 @@ def create_travel_option(db: Session, travel_option: schemas.TravelOptionCreate)
     db.add(db_option)
     db.commit()
     db.refresh(db_option)
+    notify_option_changed(db_option)
     return db_option
 
-def search_travel_options(
-    db: Session, 
+def filter_travel_options(
+    query,
     type: Optional[str] = None,
     source: Optional[str] = None,
     destination: Optional[str] = None,
     date: Optional[str] = None,
     min_price: Optional[Decimal] = None,
     max_price: Optional[Decimal] = None,
-    skip: int = 0,
-    limit: int = 100
+    include_departed: bool = False
 ):
-    query = db.query(models.TravelOption)
+    """Apply the search filters shared by search results and facets to a TravelOption query"""
+    if not include_departed:
+        query = query.filter(models.TravelOption.departure_time >= datetime.now())
     
     if type:
         query = query.filter(models.TravelOption.type.ilike(f"%{type}%"))
@@ -79,8 +107,12 @@ def search_travel_options(
     
     if date:
         try:
-            search_date = datetime.strptime(date, "%Y-%m-%d").date()
-            query = query.filter(cast(models.TravelOption.departure_time, Date) == search_date)
+            # Range instead of CAST(... AS DATE) so the departure_time index can be used
+            day_start = datetime.strptime(date, "%Y-%m-%d")
+            query = query.filter(
+                models.TravelOption.departure_time >= day_start,
+                models.TravelOption.departure_time < day_start + timedelta(days=1)
+            )
         except ValueError:
             pass  # Invalid date format, ignore filter
     
@@ -90,63 +122,379 @@ def search_travel_options(
     if max_price is not None:
         query = query.filter(models.TravelOption.price_per_seat <= max_price)
     
+    return query
+
+def search_travel_options(
+    db: Session, 
+    type: Optional[str] = None,
+    source: Optional[str] = None,
+    destination: Optional[str] = None,
+    date: Optional[str] = None,
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+    skip: int = 0,
+    limit: int = 100,
+    include_departed: bool = False
+):
+    query = filter_travel_options(
+        db.query(models.TravelOption),
+        type=type,
+        source=source,
+        destination=destination,
+        date=date,
+        min_price=min_price,
+        max_price=max_price,
+        include_departed=include_departed
+    )
+    
     # Only show options with available seats
     query = query.filter(models.TravelOption.available_seats > 0)
     
     return query.offset(skip).limit(limit).all()
 
+# Departure hour ranges [start, end) for the time-of-day facet
+TIME_OF_DAY_BUCKETS = (
+    ("night", 0, 6),
+    ("morning", 6, 12),
+    ("afternoon", 12, 18),
+    ("evening", 18, 24),
+)
+
+def get_search_facets(
+    db: Session,
+    type: Optional[str] = None,
+    source: Optional[str] = None,
+    destination: Optional[str] = None,
+    date: Optional[str] = None,
+    min_price: Optional[Decimal] = None,
+    max_price: Optional[Decimal] = None,
+    only_available: bool = True,
+    price_bucket_size: int = 1000
+):
+    """Counts per type, price histogram and departure time-of-day buckets for a search.
+
+    Everything comes from a single grouped query over (type, price bucket, departure hour);
+    the three facets are folded from its rows in Python.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite has no FLOOR(); prices are positive so truncation is equivalent
+        price_bucket = cast(models.TravelOption.price_per_seat / price_bucket_size, Integer)
+    else:
+        price_bucket = func.floor(models.TravelOption.price_per_seat / price_bucket_size)
+    hour = extract("hour", models.TravelOption.departure_time)
+
+    query = filter_travel_options(
+        db.query(models.TravelOption.type, price_bucket, hour, func.count(models.TravelOption.option_id)),
+        type=type,
+        source=source,
+        destination=destination,
+        date=date,
+        min_price=min_price,
+        max_price=max_price
+    )
+    if only_available:
+        query = query.filter(models.TravelOption.available_seats > 0)
+    rows = query.group_by(models.TravelOption.type, price_bucket, hour).all()
+
+    types = {}
+    prices = {}
+    times = {name: 0 for name, _, _ in TIME_OF_DAY_BUCKETS}
+    total = 0
+    for option_type, bucket, departure_hour, count in rows:
+        total += count
+        types[option_type] = types.get(option_type, 0) + count
+        prices[int(bucket)] = prices.get(int(bucket), 0) + count
+        for name, start, end in TIME_OF_DAY_BUCKETS:
+            if start <= departure_hour < end:
+                times[name] += count
+                break
+
+    return {
+        "total": total,
+        "types": types,
+        "price_histogram": [
+            {
+                "min_price": bucket * price_bucket_size,
+                "max_price": (bucket + 1) * price_bucket_size,
+                "count": prices[bucket]
+            }
+            for bucket in sorted(prices)
+        ],
+        "departure_times": times
+    }
+
 # Booking CRUD operations
 def create_booking(db: Session, booking: schemas.BookingCreate, user_id: int):
     # Get travel option to calculate total price
     travel_option = get_travel_option(db, booking.option_id)
-    if not travel_option:
+    if not travel_option or travel_option.departure_time < datetime.now():
         return None
     
-    if travel_option.available_seats < booking.num_seats:
+    # Reserve seats with a conditional UPDATE rather than read-modify-write, so
+    # concurrent bookings and seat releases from the payment workers are never lost;
+    # they are released again if the payment fails
+    reserved = db.query(models.TravelOption).filter(
+        models.TravelOption.option_id == booking.option_id,
+        models.TravelOption.available_seats >= booking.num_seats
+    ).update({
+        "available_seats": models.TravelOption.available_seats - booking.num_seats
+    }, synchronize_session=False)
+    if not reserved:
+        db.rollback()
         return None  # Not enough seats available
     
     total_price = travel_option.price_per_seat * booking.num_seats
     
+    # The booking stays Pending until a payment worker settles it (see payments.py)
     db_booking = models.Booking(
         user_id=user_id,
         option_id=booking.option_id,
         num_seats=booking.num_seats,
         total_price=total_price,
-        status="Confirmed"
+        status="Pending"
+    )
+    db_payment = models.Payment(
+        booking=db_booking,
+        amount=total_price,
+        payment_method=booking.payment_method,
+        status="Pending"
     )
-    
-    # Update available seats
-    travel_option.available_seats = travel_option.available_seats - booking.num_seats
     
     db.add(db_booking)
+    db.add(models.PaymentJob(payment=db_payment))
+    db.flush()
+    record_booking_status_change(db, db_booking, None, "Pending", travel_option.departure_time)
     db.commit()
     db.refresh(db_booking)
+    router.mark_write(user_id)
+    notify_seats_changed(booking.option_id)
     return db_booking
 
-def get_user_bookings(db: Session, user_id: int):
-    return db.query(models.Booking).filter(models.Booking.user_id == user_id).all()
+# Filters accepted by get_user_bookings
+BOOKING_HISTORY_FILTERS = ("upcoming", "past", "cancelled")
+
+def _booking_history_keys(booking_model, user_id: int, status_filter: Optional[str], archived: int):
+    """(booking_id, booking_date, archived) of a user's bookings in one table, filtered"""
+    option_model = booking_model.travel_option.property.mapper.class_
+    query = select(
+        booking_model.booking_id, booking_model.booking_date, literal(archived).label("archived")
+    ).join(booking_model.travel_option).where(booking_model.user_id == user_id)
+    
+    if status_filter == "cancelled":
+        query = query.where(booking_model.status == "Cancelled")
+    elif status_filter == "upcoming":
+        query = query.where(
+            booking_model.status.in_(ACTIVE_BOOKING_STATUSES),
+            option_model.departure_time >= datetime.now()
+        )
+    elif status_filter == "past":
+        query = query.where(
+            booking_model.status.in_(ACTIVE_BOOKING_STATUSES),
+            option_model.departure_time < datetime.now()
+        )
+    
+    return query
+
+def get_user_bookings(
+    db: Session,
+    user_id: int,
+    status_filter: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    """Newest first, optionally filtered to upcoming/past/cancelled, across live and archived bookings.
+
+    The page is picked in SQL from a UNION ALL of both tables' (booking_id, booking_date)
+    keys, so only the bookings on the page are loaded as objects.
+    """
+    keys = [_booking_history_keys(models.Booking, user_id, status_filter, 0)]
+    if status_filter != "upcoming":
+        # Archived bookings all belong to departed trips
+        keys.append(_booking_history_keys(models.ArchivedBooking, user_id, status_filter, 1))
+    history = union_all(*keys).subquery()
+    page = db.execute(
+        select(history.c.booking_id, history.c.archived)
+        .order_by(history.c.booking_date.desc(), history.c.booking_id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    
+    loaded = {}
+    for archived, booking_model in ((0, models.Booking), (1, models.ArchivedBooking)):
+        booking_ids = [booking_id for booking_id, is_archived in page if is_archived == archived]
+        if booking_ids:
+            for booking in db.query(booking_model).options(joinedload(booking_model.travel_option)).filter(
+                booking_model.booking_id.in_(booking_ids)
+            ):
+                loaded[(archived, booking.booking_id)] = booking
+    # A booking archived between the two queries drops off this page
+    return [loaded[(archived, booking_id)] for booking_id, archived in page if (archived, booking_id) in loaded]
 
 def get_booking(db: Session, booking_id: int, user_id: int):
-    return db.query(models.Booking).filter(
+    booking = db.query(models.Booking).filter(
         and_(models.Booking.booking_id == booking_id, models.Booking.user_id == user_id)
     ).first()
+    if booking is None:
+        # Bookings for departed options may have been moved to the archive
+        booking = db.query(models.ArchivedBooking).filter(
+            and_(models.ArchivedBooking.booking_id == booking_id, models.ArchivedBooking.user_id == user_id)
+        ).first()
+    return booking
+
+class PaymentInProgress(Exception):
+    """A payment worker is charging the booking right now; it can be cancelled once settled."""
 
 def cancel_booking(db: Session, booking_id: int, user_id: int):
-    booking = get_booking(db, booking_id, user_id)
-    if booking and booking.status == "Confirmed":
+    # Archived bookings belong to departed trips and cannot be cancelled
+    booking = db.query(models.Booking).filter(
+        and_(models.Booking.booking_id == booking_id, models.Booking.user_id == user_id)
+    ).first()
+    if booking and booking.status in ACTIVE_BOOKING_STATUSES:
+        old_status = booking.status
+        if old_status == "Pending":
+            # Take the payment job off the queue; this races with the workers' claim,
+            # so only a job that is still Queued can be cancelled
+            cancelled = db.query(models.PaymentJob).filter(
+                models.PaymentJob.payment_id == booking.payment.payment_id,
+                models.PaymentJob.status == "Queued"
+            ).update({"status": "Cancelled", "finished_at": datetime.now()}, synchronize_session=False)
+            if not cancelled:
+                db.rollback()
+                raise PaymentInProgress()
+            booking.payment.status = "Cancelled"
+        
         # Update booking status
         booking.status = "Cancelled"
         
         # Return seats to travel option
         travel_option = get_travel_option(db, booking.option_id)
         if travel_option:
-            travel_option.available_seats = travel_option.available_seats + booking.num_seats
+            db.query(models.TravelOption).filter(
+                models.TravelOption.option_id == booking.option_id
+            ).update({
+                "available_seats": models.TravelOption.available_seats + booking.num_seats
+            }, synchronize_session=False)
         
+        record_booking_status_change(
+            db, booking, old_status, "Cancelled",
+            travel_option.departure_time if travel_option else None
+        )
         db.commit()
         db.refresh(booking)
+        router.mark_write(user_id)
+        if travel_option:
+            notify_seats_changed(booking.option_id)
         return booking
     return None
 
+# Booking summary operations
+ACTIVE_BOOKING_STATUSES = ("Pending", "Confirmed")
+
+def _set_next_trip(db: Session, summary: models.UserBookingSummary):
+    next_trip = db.query(models.Booking.booking_id, models.TravelOption.departure_time).join(
+        models.Booking.travel_option
+    ).filter(
+        models.Booking.user_id == summary.user_id,
+        models.Booking.status.in_(ACTIVE_BOOKING_STATUSES),
+        models.TravelOption.departure_time >= datetime.now()
+    ).order_by(models.TravelOption.departure_time).first()
+    summary.next_booking_id, summary.next_departure_time = next_trip if next_trip else (None, None)
+
+def _rebuild_booking_summary(db: Session, summary: models.UserBookingSummary):
+    """Aggregate a user's bookings into their summary row (backfill for existing users)"""
+    counts = {}
+    spent = Decimal("0")
+    for booking_model in (models.Booking, models.ArchivedBooking):
+        rows = db.query(
+            booking_model.status, func.count(booking_model.booking_id), func.sum(booking_model.total_price)
+        ).filter(booking_model.user_id == summary.user_id).group_by(booking_model.status).all()
+        for status, count, total in rows:
+            counts[status] = counts.get(status, 0) + count
+            if status in ACTIVE_BOOKING_STATUSES:
+                spent += Decimal(total or 0)
+    
+    summary.total_bookings = sum(counts.values())
+    summary.active_bookings = sum(counts.get(status, 0) for status in ACTIVE_BOOKING_STATUSES)
+    summary.cancelled_bookings = counts.get("Cancelled", 0)
+    summary.failed_bookings = counts.get("Failed", 0)
+    summary.total_spent = spent
+    _set_next_trip(db, summary)
+
+def _get_or_create_booking_summary(db: Session, user_id: int):
+    """Return (summary, created); a newly created row is backfilled from the user's bookings.
+
+    The row is created with INSERT ... ON CONFLICT DO NOTHING, so when two requests
+    race to create it one of them simply gets the other's row (created=False).
+    """
+    summary = db.get(models.UserBookingSummary, user_id)
+    if summary is not None:
+        return summary, False
+    
+    db.flush()
+    if db.get_bind().dialect.name == "postgresql":
+        insert = postgresql.insert
+    else:
+        insert = sqlite.insert
+    created = db.execute(
+        insert(models.UserBookingSummary).values(user_id=user_id).on_conflict_do_nothing(index_elements=["user_id"])
+    ).rowcount == 1
+    summary = db.get(models.UserBookingSummary, user_id)
+    if created:
+        _rebuild_booking_summary(db, summary)
+    return summary, created
+
+def record_booking_status_change(
+    db: Session,
+    booking: models.Booking,
+    old_status: Optional[str],
+    new_status: str,
+    departure_time: Optional[datetime]
+):
+    """Apply one booking transition (old_status None = new booking) to the user's summary.
+
+    Call before committing the booking change so both land in the same transaction.
+    Counters are updated as `column = column + delta` so concurrent bookings don't
+    overwrite each other.
+    """
+    summary, created = _get_or_create_booking_summary(db, booking.user_id)
+    if created:
+        # Backfilled from the flushed state, which already includes this change
+        return
+    
+    was_active = old_status in ACTIVE_BOOKING_STATUSES
+    is_active = new_status in ACTIVE_BOOKING_STATUSES
+    Summary = models.UserBookingSummary
+    
+    if old_status is None:
+        summary.total_bookings = Summary.total_bookings + 1
+    if was_active != is_active:
+        sign = 1 if is_active else -1
+        summary.active_bookings = Summary.active_bookings + sign
+        summary.total_spent = Summary.total_spent + sign * booking.total_price
+    if new_status == "Cancelled":
+        summary.cancelled_bookings = Summary.cancelled_bookings + 1
+    if new_status == "Failed":
+        summary.failed_bookings = Summary.failed_bookings + 1
+    
+    if is_active and departure_time is not None and departure_time >= datetime.now():
+        if summary.next_departure_time is None or summary.next_departure_time < datetime.now() \
+                or departure_time < summary.next_departure_time:
+            summary.next_booking_id = booking.booking_id
+            summary.next_departure_time = departure_time
+    elif not is_active and summary.next_booking_id == booking.booking_id:
+        db.flush()
+        _set_next_trip(db, summary)
+
+def get_booking_summary(db: Session, user_id: int):
+    summary, created = _get_or_create_booking_summary(db, user_id)
+    if created:
+        db.commit()
+    elif summary.next_departure_time is not None and summary.next_departure_time < datetime.now():
+        # The next trip has departed since it was recorded; find the following one
+        _set_next_trip(db, summary)
+        db.commit()
+    return summary
+
 def get_all_bookings(db: Session, skip: int = 0, limit: int = 100):
     """Admin function to get all bookings"""
     return db.query(models.Booking).offset(skip).limit(limit).all()
@@ -1,17 +1,38 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-import os 
+import itertools
+import ctypes
+import mmap
+import threading
+import time
+import os
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("POSTGRES_DSN", "sqlite:///./travel_booking.db")
 
+# Comma-separated list of read replica DSNs, e.g.
+# POSTGRES_REPLICA_DSNS=postgresql://.../replica1,postgresql://.../replica2
+REPLICA_URLS = [
+    dsn.strip() for dsn in os.getenv("POSTGRES_REPLICA_DSNS", "").split(",") if dsn.strip()
+]
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "10"))
+# Seconds to wait for a replica connection before treating it as unhealthy
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "3"))
+# How long a user's reads stay on the primary after they write (replication lag budget)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Connection pool per process; with several server workers the primary sees
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections at most
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
 print(f"Attempting to connect to: {DATABASE_URL}")
 
 try:
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
     # Test connection
     with engine.connect() as conn:
         print("✅ Database connection successful!")
@@ -19,9 +40,138 @@ except Exception as e:
     print(f"❌ Database connection failed: {e}")
     print("Switching to SQLite for development...")
     DATABASE_URL = "sqlite:///./travel_booking.db"
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
     print("✅ Using SQLite database instead")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+class SharedStickyTable:
+    """Fixed-size user_id -> pinned-until table in anonymous shared memory.
+
+    It is created at import, so when the app is preloaded before forking
+    (gunicorn_conf.py) all workers share it and a user's read-your-writes pin holds
+    whichever worker serves their next request. Users hashing to the same slot
+    overwrite each other's pin, which only costs them a possibly stale read.
+    """
+
+    def __init__(self, slots=65536):
+        self.slots = slots
+        self._buffer = mmap.mmap(-1, slots * 16)
+        self._user_ids = (ctypes.c_int64 * slots).from_buffer(self._buffer)
+        self._until = (ctypes.c_double * slots).from_buffer(self._buffer, slots * 8)
+
+    def pin(self, user_id, seconds):
+        slot = user_id % self.slots
+        self._user_ids[slot] = user_id
+        self._until[slot] = time.time() + seconds
+
+    def is_pinned(self, user_id):
+        slot = user_id % self.slots
+        return self._user_ids[slot] == user_id and self._until[slot] > time.time()
+
+
+class ReplicaRouter:
+    """Routes read sessions to healthy replicas and everything else to the primary.
+
+    Replicas are health checked at most once per REPLICA_HEALTH_CHECK_INTERVAL;
+    unhealthy replicas are skipped until a later check succeeds. When no replica
+    is configured or healthy, reads fall back to the primary.
+
+    The periodic check runs on whichever request thread notices it is due; only
+    one thread checks at a time and the others keep routing with the last result.
+    """
+
+    def __init__(self, primary, replica_urls):
+        self.primary = primary
+        self.replicas = [self._create_replica_engine(url) for url in replica_urls]
+        self._healthy = list(self.replicas)
+        self._round_robin = itertools.cycle(self._healthy)
+        self._last_check = 0.0
+        self._recent_writers = SharedStickyTable()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    @staticmethod
+    def _create_replica_engine(url):
+        connect_args = {}
+        if make_url(url).get_backend_name() == "postgresql":
+            # Fail fast on a replica that accepts no connections instead of the OS default
+            connect_args["connect_timeout"] = REPLICA_CONNECT_TIMEOUT
+        return create_engine(
+            url, pool_pre_ping=True, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+            connect_args=connect_args
+        )
+
+    def check_health(self):
+        healthy = []
+        for replica in self.replicas:
+            try:
+                with replica.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                healthy.append(replica)
+            except Exception as e:
+                print(f"❌ Replica {replica.url.render_as_string(hide_password=True)} unhealthy: {e}")
+        with self._lock:
+            self._healthy = healthy
+            self._round_robin = itertools.cycle(healthy)
+            self._last_check = time.monotonic()
+        return healthy
+
+    def mark_write(self, user_id):
+        """Pin a user's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+        if not self.replicas or user_id is None:
+            return
+        self._recent_writers.pin(user_id, READ_YOUR_WRITES_SECONDS)
+
+    def read_engine(self, user_id=None):
+        if not self.replicas:
+            return self.primary
+        if time.monotonic() - self._last_check > REPLICA_HEALTH_CHECK_INTERVAL \
+                and self._check_lock.acquire(blocking=False):
+            try:
+                self.check_health()
+            finally:
+                self._check_lock.release()
+        if user_id is not None and self._recent_writers.is_pinned(user_id):
+            return self.primary
+        with self._lock:
+            if not self._healthy:
+                return self.primary
+            return next(self._round_robin)
+
+    def reset_after_fork(self):
+        """Drop pooled connections inherited from the parent process (see gunicorn_conf.py)."""
+        for db_engine in [self.primary] + self.replicas:
+            # close=False leaves the parent's sockets alone; the child just opens new ones
+            db_engine.dispose(close=False)
+        # Health is re-checked per worker; the shared read-your-writes table is kept
+        with self._lock:
+            self._last_check = 0.0
+
+    def status(self):
+        with self._lock:
+            healthy = set(id(replica) for replica in self._healthy)
+        return [
+            {
+                "url": replica.url.render_as_string(hide_password=True),
+                "healthy": id(replica) in healthy,
+            }
+            for replica in self.replicas
+        ]
+
+
+router = ReplicaRouter(engine, REPLICA_URLS)
+if REPLICA_URLS:
+    print(f"✅ {len(router.check_health())}/{len(REPLICA_URLS)} read replicas healthy")
+
+
+def reset_after_fork():
+    router.reset_after_fork()
+
+
+def ReadSessionLocal(user_id=None):
+    """Session for catalog/listing reads, bound to a replica when one is available."""
+    return SessionLocal(bind=router.read_engine(user_id))
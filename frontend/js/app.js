@@ -104,7 +104,7 @@ class TravelBookingAPI {
     }
 
     async getUserBookings() {
-        return await this.request('/bookings');
+        return await this.request('/bookings?limit=100');
     }
 
     async getBooking(bookingId) {
@@ -390,7 +390,7 @@ async function handleBooking(event) {
     try {
         showLoading(true);
         await api.createBooking(bookingData);
-        showAlert('Booking created successfully!', 'success');
+        showAlert('Booking created! Your payment is being processed.', 'success');
         closeBookingModal();
         loadTravelOptions(); // Refresh to show updated seat counts
     } catch (error) {
@@ -447,7 +447,7 @@ function displayUserBookings(bookings) {
                     <div class="detail-value">${formatDateTime(booking.booking_date)}</div>
                 </div>
             </div>
-            ${booking.status === 'Confirmed' ? 
+            ${booking.status === 'Confirmed' || booking.status === 'Pending' ? 
                 `<button class="btn btn-danger btn-small" onclick="cancelBooking(${booking.booking_id})">Cancel Booking</button>` : 
                 ''
             }
@@ -0,0 +1,46 @@
+"""
+Gunicorn configuration for production
+
+Runs the FastAPI app under uvicorn workers:
+    gunicorn app:app -c gunicorn_conf.py
+(or: python run_server.py --prod)
+
+- One worker per CPU this process may run on by default (override with
+  WEB_CONCURRENCY, which container platforms with CPU quotas should set)
+- The app is imported once in the master and forked (PRELOAD_APP=false to disable),
+  so table creation runs once and workers share the read-your-writes table in
+  database.py. Pooled DB connections are dropped in each worker after fork;
+  per-worker state (payment workers, catalog snapshot, archival loop) starts in
+  the app's startup event, which runs inside each worker.
+- On SIGTERM workers answer 503 on /ready for DRAIN_DELAY_SECONDS while still
+  serving requests, so load balancers stop routing to them before the listening
+  socket closes; then they get the rest of GRACEFUL_TIMEOUT seconds to finish
+  in-flight requests and payments.
+"""
+
+import multiprocessing
+import os
+
+
+def available_cpus():
+    # Unlike multiprocessing.cpu_count(), respects CPU affinity (taskset, container cpusets)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS / Windows
+        return multiprocessing.cpu_count()
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", available_cpus()))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = 5
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # Connections inherited from the master must not be shared between processes
+    import database
+    database.reset_after_fork()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DECIMAL, TIMESTAMP, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DECIMAL, TIMESTAMP, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -22,13 +22,15 @@ class User(Base):
 # Travel Options Table
 class TravelOption(Base):
     __tablename__ = "travel_options"
+    # AUTOINCREMENT so SQLite never reuses the ids of rows moved to the archive
+    __table_args__ = {"sqlite_autoincrement": True}
 
     option_id = Column(Integer, primary_key=True, index=True)
     title = Column(String(100), nullable=False)
     type = Column(String(50), nullable=False)       # e.g., Flight / Train / Bus
     source = Column(String(100), nullable=False)
     destination = Column(String(100), nullable=False)
-    departure_time = Column(DateTime, nullable=False)
+    departure_time = Column(DateTime, nullable=False, index=True)
     arrival_time = Column(DateTime, nullable=False)
     price_per_seat = Column(DECIMAL(10, 2), nullable=False)
     available_seats = Column(Integer, nullable=False)
@@ -39,6 +41,11 @@ class TravelOption(Base):
 # Bookings Table
 class Booking(Base):
     __tablename__ = "bookings"
+    # Serves the paginated, status-filtered booking history of a user
+    __table_args__ = (
+        Index("ix_bookings_user_status_date", "user_id", "status", "booking_date"),
+        {"sqlite_autoincrement": True},
+    )
 
     booking_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"))
@@ -53,9 +60,28 @@ class Booking(Base):
     payment = relationship("Payment", back_populates="booking", uselist=False)
 
 
+# Per-user booking summary, maintained in the same transaction as booking writes
+# (see crud.record_booking_status_change) instead of aggregated on read
+class UserBookingSummary(Base):
+    __tablename__ = "user_booking_summaries"
+
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    total_bookings = Column(Integer, nullable=False, default=0)
+    active_bookings = Column(Integer, nullable=False, default=0)      # Pending + Confirmed
+    cancelled_bookings = Column(Integer, nullable=False, default=0)
+    failed_bookings = Column(Integer, nullable=False, default=0)
+    total_spent = Column(DECIMAL(12, 2), nullable=False, default=0)   # over active bookings
+    next_booking_id = Column(Integer, ForeignKey("bookings.booking_id", ondelete="SET NULL"))
+    next_departure_time = Column(DateTime)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    next_trip = relationship("Booking")
+
+
 # Payments Table (Optional)
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     payment_id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.booking_id", ondelete="CASCADE"))
@@ -65,3 +91,81 @@ class Payment(Base):
     status = Column(String(20), default="Success")
 
     booking = relationship("Booking", back_populates="payment")
+
+
+# Payment Jobs Table - persistent queue consumed by the payment workers (see payments.py)
+class PaymentJob(Base):
+    __tablename__ = "payment_jobs"
+    __table_args__ = (Index("ix_payment_jobs_status_run_after", "status", "run_after"),)
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    payment_id = Column(Integer, ForeignKey("payments.payment_id", ondelete="CASCADE"), index=True)
+    status = Column(String(20), default="Queued")    # Queued / Running / Done / Failed / Cancelled
+    attempts = Column(Integer, default=0, nullable=False)
+    run_after = Column(DateTime, default=datetime.now)
+    last_error = Column(String(255))
+    # Set in Python: SQLite's CURRENT_TIMESTAMP has only second precision, too coarse for latency stats
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    payment = relationship("Payment")
+
+
+# Archive tables for departed travel options and their bookings (see archival.py)
+class ArchivedTravelOption(Base):
+    __tablename__ = "travel_options_archive"
+
+    option_id = Column(Integer, primary_key=True)
+    title = Column(String(100), nullable=False)
+    type = Column(String(50), nullable=False)
+    source = Column(String(100), nullable=False)
+    destination = Column(String(100), nullable=False)
+    departure_time = Column(DateTime, nullable=False, index=True)
+    arrival_time = Column(DateTime, nullable=False)
+    price_per_seat = Column(DECIMAL(10, 2), nullable=False)
+    available_seats = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now())
+
+    bookings = relationship("ArchivedBooking", back_populates="travel_option")
+
+
+class ArchivedBooking(Base):
+    __tablename__ = "bookings_archive"
+    __table_args__ = (Index("ix_bookings_archive_user_status_date", "user_id", "status", "booking_date"),)
+
+    booking_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.user_id", ondelete="CASCADE"))
+    option_id = Column(Integer, ForeignKey("travel_options_archive.option_id", ondelete="CASCADE"))
+    num_seats = Column(Integer, nullable=False)
+    total_price = Column(DECIMAL(10, 2), nullable=False)
+    booking_date = Column(DateTime)
+    status = Column(String(20))
+    archived_at = Column(DateTime, server_default=func.now())
+
+    user = relationship("User")
+    travel_option = relationship("ArchivedTravelOption", back_populates="bookings")
+
+
+class ArchivedPayment(Base):
+    __tablename__ = "payments_archive"
+
+    payment_id = Column(Integer, primary_key=True)
+    booking_id = Column(Integer, ForeignKey("bookings_archive.booking_id", ondelete="CASCADE"), index=True)
+    amount = Column(DECIMAL(10, 2), nullable=False)
+    payment_method = Column(String(50))
+    payment_date = Column(DateTime)
+    status = Column(String(20))
+    archived_at = Column(DateTime, server_default=func.now())
+
+
+def create_missing_indexes(bind):
+    """Create indexes declared on tables that already existed.
+
+    Base.metadata.create_all skips existing tables along with their indexes, so
+    indexes added to a model later (e.g. travel_options.departure_time, the
+    bookings history index) would never reach an existing database otherwise.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
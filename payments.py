@@ -0,0 +1,284 @@
+"""
+Asynchronous payment processing
+
+Creating a booking reserves the seats and enqueues a PaymentJob for its pending
+Payment (see crud.create_booking). A pool of worker threads claims queued jobs,
+charges them through a PaymentGateway and settles the booking:
+
+- success: Payment "Success", Booking "Confirmed"
+- declined, or still failing after PAYMENT_MAX_ATTEMPTS: Payment and Booking
+  "Failed" and the reserved seats are released
+- transient gateway error: the job is re-queued with exponential backoff
+
+The payment_jobs table is the queue, so pending payments survive restarts and
+several app processes can share it. Jobs stuck in "Running" (the worker died or
+failed to record the outcome) are re-queued periodically; the gateway receives
+a per-payment idempotency key so a re-run never charges twice.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from database import SessionLocal
+import models
+import crud
+import threading
+import random
+import time
+import os
+
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", "4"))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv("PAYMENT_MAX_ATTEMPTS", "5"))
+PAYMENT_RETRY_BASE_SECONDS = float(os.getenv("PAYMENT_RETRY_BASE_SECONDS", "1"))
+PAYMENT_RETRY_MAX_SECONDS = float(os.getenv("PAYMENT_RETRY_MAX_SECONDS", "60"))
+PAYMENT_POLL_SECONDS = float(os.getenv("PAYMENT_POLL_SECONDS", "0.5"))
+# Jobs left "Running" longer than this (e.g. the worker process died) are re-queued
+PAYMENT_JOB_TIMEOUT_SECONDS = int(os.getenv("PAYMENT_JOB_TIMEOUT_SECONDS", "300"))
+# How often the workers look for such stale jobs
+PAYMENT_REQUEUE_INTERVAL_SECONDS = float(os.getenv("PAYMENT_REQUEUE_INTERVAL_SECONDS", "30"))
+
+
+class PaymentDeclined(Exception):
+    """The gateway refused the payment; retrying will not help."""
+
+
+class GatewayError(Exception):
+    """Transient gateway failure; the payment can be retried."""
+
+
+class PaymentGateway:
+    """Interface for payment providers. `charge` returns normally on success.
+
+    Repeated calls with the same `idempotency_key` must charge at most once and
+    return the outcome of the first successful call.
+    """
+
+    def charge(self, payment: models.Payment, idempotency_key: str):
+        raise NotImplementedError
+
+
+class FakePaymentGateway(PaymentGateway):
+    """Local stand-in for a real provider with configurable latency and failure rates."""
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0, decline_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self._charged = set()
+
+    def charge(self, payment: models.Payment, idempotency_key: str):
+        if idempotency_key in self._charged:
+            return  # Already charged, e.g. the job was re-queued after a lost result
+        time.sleep(self.latency)
+        roll = random.random()
+        if roll < self.decline_rate:
+            raise PaymentDeclined("Payment declined")
+        if roll < self.decline_rate + self.failure_rate:
+            raise GatewayError("Payment gateway unavailable")
+        self._charged.add(idempotency_key)
+
+
+def get_gateway():
+    return FakePaymentGateway(
+        latency=float(os.getenv("FAKE_PAYMENT_LATENCY", "0.05")),
+        failure_rate=float(os.getenv("FAKE_PAYMENT_FAILURE_RATE", "0")),
+        decline_rate=float(os.getenv("FAKE_PAYMENT_DECLINE_RATE", "0"))
+    )
+
+
+def retry_delay(attempts: int):
+    delay = min(PAYMENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1), PAYMENT_RETRY_MAX_SECONDS)
+    return delay + random.uniform(0, PAYMENT_RETRY_BASE_SECONDS)
+
+
+def requeue_stale_jobs(db: Session):
+    cutoff = datetime.now() - timedelta(seconds=PAYMENT_JOB_TIMEOUT_SECONDS)
+    requeued = db.query(models.PaymentJob).filter(
+        models.PaymentJob.status == "Running",
+        models.PaymentJob.started_at < cutoff
+    ).update({"status": "Queued", "run_after": datetime.now()}, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def claim_next_job(db: Session):
+    """Atomically move the oldest due job from Queued to Running, or return None."""
+    while True:
+        now = datetime.now()
+        job_id = db.query(models.PaymentJob.job_id).filter(
+            models.PaymentJob.status == "Queued",
+            models.PaymentJob.run_after <= now
+        ).order_by(models.PaymentJob.run_after).limit(1).scalar()
+        if job_id is None:
+            return None
+
+        # Conditional update so only one worker (in any process) wins the job
+        claimed = db.query(models.PaymentJob).filter(
+            models.PaymentJob.job_id == job_id,
+            models.PaymentJob.status == "Queued"
+        ).update({
+            "status": "Running",
+            "started_at": now,
+            "attempts": models.PaymentJob.attempts + 1
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.query(models.PaymentJob).filter(models.PaymentJob.job_id == job_id).first()
+
+
+def fail_payment(db: Session, job: models.PaymentJob, error: str):
+    payment = job.payment
+    booking = payment.booking
+    now = datetime.now()
+
+    payment.status = "Failed"
+    booking.status = "Failed"
+    # Release the seats reserved when the booking was created
+    db.query(models.TravelOption).filter(
+        models.TravelOption.option_id == booking.option_id
+    ).update({
+        "available_seats": models.TravelOption.available_seats + booking.num_seats
+    }, synchronize_session=False)
+
+    crud.record_booking_status_change(db, booking, "Pending", "Failed", None)
+
+    job.status = "Failed"
+    job.last_error = error[:255]
+    job.finished_at = now
+    db.commit()
+    crud.notify_seats_changed(booking.option_id)
+
+
+def idempotency_key(payment: models.Payment):
+    # Stable across retries and re-queues of the same payment
+    return f"payment-{payment.payment_id}"
+
+
+def process_job(db: Session, job: models.PaymentJob, gateway: PaymentGateway):
+    payment = job.payment
+    if payment.status != "Pending":
+        # Settled by an earlier run of this job that was re-queued as stale
+        job.status = "Done"
+        job.finished_at = datetime.now()
+        db.commit()
+        return
+    try:
+        gateway.charge(payment, idempotency_key(payment))
+    except PaymentDeclined as e:
+        fail_payment(db, job, str(e))
+    except Exception as e:
+        if job.attempts >= PAYMENT_MAX_ATTEMPTS:
+            fail_payment(db, job, str(e))
+        else:
+            job.status = "Queued"
+            job.last_error = str(e)[:255]
+            job.run_after = datetime.now() + timedelta(seconds=retry_delay(job.attempts))
+            db.commit()
+    else:
+        now = datetime.now()
+        payment.status = "Success"
+        payment.payment_date = now
+        payment.booking.status = "Confirmed"
+        job.status = "Done"
+        job.finished_at = now
+        db.commit()
+
+
+def get_queue_stats(db: Session, sample_size: int = 1000):
+    """Queue depth per status plus latency (enqueue to settle) of the most recent jobs."""
+    counts = dict(
+        db.query(models.PaymentJob.status, func.count(models.PaymentJob.job_id))
+        .group_by(models.PaymentJob.status)
+        .all()
+    )
+    oldest_queued = db.query(func.min(models.PaymentJob.created_at)).filter(
+        models.PaymentJob.status == "Queued"
+    ).scalar()
+    recent = db.query(models.PaymentJob.created_at, models.PaymentJob.finished_at).filter(
+        models.PaymentJob.status.in_(("Done", "Failed"))
+    ).order_by(models.PaymentJob.finished_at.desc()).limit(sample_size).all()
+
+    latencies = sorted((finished - created).total_seconds() for created, finished in recent)
+    return {
+        "queued": counts.get("Queued", 0),
+        "running": counts.get("Running", 0),
+        "done": counts.get("Done", 0),
+        "failed": counts.get("Failed", 0),
+        "cancelled": counts.get("Cancelled", 0),
+        "oldest_queued_seconds": (datetime.now() - oldest_queued).total_seconds() if oldest_queued else 0,
+        "latency_avg_seconds": sum(latencies) / len(latencies) if latencies else None,
+        "latency_p95_seconds": latencies[int(len(latencies) * 0.95)] if latencies else None
+    }
+
+
+class PaymentWorkerPool:
+    """Threads that drain the payment_jobs queue. Throughput scales with `workers`."""
+
+    def __init__(self, gateway: PaymentGateway, workers: int = PAYMENT_WORKERS):
+        self.gateway = gateway
+        self.workers = workers
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._requeue_lock = threading.Lock()
+        self._last_requeue = float("-inf")
+
+    def start(self):
+        self._requeue_stale()
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"payment-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def wake(self):
+        """Called after enqueueing so idle workers don't wait for the next poll."""
+        self._wake.set()
+
+    def stop(self, timeout: float = 30):
+        """Stop claiming new jobs and wait for in-flight payments to settle."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _requeue_stale(self):
+        """Re-queue stale jobs at most once per interval, from one thread at a time."""
+        if time.monotonic() - self._last_requeue < PAYMENT_REQUEUE_INTERVAL_SECONDS \
+                or not self._requeue_lock.acquire(blocking=False):
+            return
+        db = SessionLocal()
+        try:
+            self._last_requeue = time.monotonic()
+            requeued = requeue_stale_jobs(db)
+            if requeued:
+                print(f"⚠️  Re-queued {requeued} stale payment jobs")
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Payment requeue error: {e}")
+        finally:
+            db.close()
+            self._requeue_lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._requeue_stale()
+            db = SessionLocal()
+            try:
+                job = claim_next_job(db)
+                if job is not None:
+                    process_job(db, job, self.gateway)
+                    continue
+            except Exception as e:
+                db.rollback()
+                print(f"❌ Payment worker error: {e}")
+            finally:
+                db.close()
+            self._wake.wait(PAYMENT_POLL_SECONDS)
+            self._wake.clear()
+
+
+worker_pool = PaymentWorkerPool(get_gateway())
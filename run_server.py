@@ -8,18 +8,55 @@ To run:
 1. Open terminal in the project directory
 2. Activate fastapi environment: conda activate fastapi_env
 3. Run: python run_server.py
+
+Production mode (multiple workers, no auto-reload):
+    python run_server.py --prod
+Uses gunicorn with gunicorn_conf.py when available (Linux/macOS), otherwise
+uvicorn's own multi-process mode without preloading.
 """
 
 import uvicorn
+import argparse
+import sys
 import os
+from gunicorn_conf import available_cpus
+
+
+def run_production():
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        workers = int(os.getenv("WEB_CONCURRENCY", available_cpus()))
+        print(f"⚠️  gunicorn not available, starting {workers} uvicorn workers without preloading")
+        uvicorn.run(
+            "app:app",
+            host="0.0.0.0",
+            port=int(os.getenv("PORT", 8000)),
+            workers=workers,
+            timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+        )
+        return
+
+    # Replace this process with gunicorn so it receives SIGTERM directly
+    os.execvp("gunicorn", ["gunicorn", "app:app", "-c", "gunicorn_conf.py"])
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the Travel Booking Application")
+    parser.add_argument("--prod", action="store_true", help="multi-worker production mode")
+    args = parser.parse_args()
+
+    if args.prod:
+        print("🚀 Starting Travel Booking Application (production)...")
+        run_production()
+        sys.exit(0)
+
     print("🚀 Starting Travel Booking Application...")
     print("📍 Frontend will be available at: http://localhost:8000")
     print("📡 API documentation at: http://localhost:8000/docs")
     print("⚡ Auto-reload enabled for development")
     print("\n" + "="*50)
-    
+
     uvicorn.run(
         "app:app",
         host="0.0.0.0",
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from decimal import Decimal
 
@@ -51,7 +51,7 @@ class BookingBase(BaseModel):
     num_seats: int
 
 class BookingCreate(BookingBase):
-    pass
+    payment_method: Optional[str] = "Card"
 
 class Booking(BookingBase):
     booking_id: int
@@ -75,6 +75,17 @@ class BookingResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BookingSummary(BaseModel):
+    total_bookings: int
+    active_bookings: int
+    cancelled_bookings: int
+    failed_bookings: int
+    total_spent: Decimal
+    next_trip: Optional[Booking] = None
+
+    class Config:
+        from_attributes = True
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -91,3 +102,19 @@ class TravelSearchFilter(BaseModel):
     date: Optional[str] = None
     min_price: Optional[Decimal] = None
     max_price: Optional[Decimal] = None
+
+# Search facet schemas
+class PriceBucket(BaseModel):
+    min_price: Decimal
+    max_price: Decimal
+    count: int
+
+class SearchFacets(BaseModel):
+    total: int
+    types: Dict[str, int]
+    price_histogram: List[PriceBucket]
+    departure_times: Dict[str, int]
+
+class TravelOptionSearchResult(BaseModel):
+    results: List[TravelOption]
+    facets: SearchFacets
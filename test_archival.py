@@ -0,0 +1,79 @@
+import sys
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import models
+import archival
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archival.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def add_departed_option(db, title, hours_ago=48):
+    departure = datetime.now() - timedelta(hours=hours_ago)
+    option = models.TravelOption(
+        title=title, type="Bus", source="Pune", destination="Goa",
+        departure_time=departure, arrival_time=departure + timedelta(hours=8),
+        price_per_seat=Decimal("500.00"), available_seats=10
+    )
+    booking = models.Booking(user_id=None, travel_option=option, num_seats=1, total_price=Decimal("500.00"), status="Confirmed")
+    db.add_all([option, booking, models.Payment(booking=booking, amount=Decimal("500.00"), status="Success")])
+    db.commit()
+    return option
+
+
+def test_archiving_twice_with_new_rows_in_between(db):
+    first = add_departed_option(db, "First")
+    first_ids = (first.option_id, first.bookings[0].booking_id, first.bookings[0].payment.payment_id)
+    assert archival.archive_departed_options(db) == 1
+
+    # The archived rows had the highest ids; new rows must not get them again
+    second = add_departed_option(db, "Second")
+    second_ids = (second.option_id, second.bookings[0].booking_id, second.bookings[0].payment.payment_id)
+    assert all(new > old for new, old in zip(second_ids, first_ids))
+
+    assert archival.archive_departed_options(db) == 1
+    assert db.query(models.TravelOption).count() == 0
+    assert db.query(models.ArchivedTravelOption).count() == 2
+    assert db.query(models.ArchivedBooking).count() == 2
+    assert db.query(models.ArchivedPayment).count() == 2
+
+
+def test_reused_ids_are_skipped_instead_of_failing(db):
+    # Simulates a database created before AUTOINCREMENT: a live id already in the archive
+    reused_id = add_departed_option(db, "Reused", hours_ago=72).option_id
+    other_id = add_departed_option(db, "Other").option_id
+    db.execute(insert(models.ArchivedTravelOption.__table__).values(
+        option_id=reused_id, title="Old", type="Bus", source="Pune", destination="Goa",
+        departure_time=datetime.now() - timedelta(days=30), arrival_time=datetime.now() - timedelta(days=30),
+        price_per_seat=Decimal("100.00"), available_seats=0
+    ))
+    db.commit()
+    cutoff = datetime.now() - timedelta(hours=archival.ARCHIVE_AFTER_HOURS)
+
+    assert archival.archive_departed_options(db) == 1
+    assert archival.archive_departed_options(db) == 0
+    assert [option.option_id for option in db.query(models.TravelOption)] == [reused_id]
+    assert db.get(models.ArchivedTravelOption, other_id) is not None
+    assert archival.count_reused_id_options(db, cutoff) == 1
+
+
+def test_options_with_pending_bookings_stay_live(db):
+    option = add_departed_option(db, "Pending")
+    option.bookings[0].status = "Pending"
+    db.commit()
+    assert archival.archive_departed_options(db) == 0
+    assert db.query(models.TravelOption).count() == 1
@@ -0,0 +1,202 @@
+import sys
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+import models
+import schemas
+import crud
+import archival
+import payments
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bookings.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = models.User(username="traveller", email="traveller@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def add_option(db, departure, seats=10, price="1000.00"):
+    option = models.TravelOption(
+        title="Test Express", type="Train", source="Mumbai", destination="Delhi",
+        departure_time=departure, arrival_time=departure + timedelta(hours=16),
+        price_per_seat=Decimal(price), available_seats=seats
+    )
+    db.add(option)
+    db.commit()
+    return option
+
+
+def book(db, user, option, seats=1):
+    return crud.create_booking(db, schemas.BookingCreate(option_id=option.option_id, num_seats=seats), user.user_id)
+
+
+def job_for(db, booking):
+    return db.query(models.PaymentJob).filter(models.PaymentJob.payment_id == booking.payment.payment_id).one()
+
+
+def assert_summary_matches_bookings(db, user_id):
+    """Compare the incrementally maintained summary with a fresh aggregate."""
+    db.expire_all()
+    summary = db.get(models.UserBookingSummary, user_id)
+    counts = {}
+    spent = Decimal("0")
+    for booking_model in (models.Booking, models.ArchivedBooking):
+        for status, count, total in db.query(
+            booking_model.status, func.count(booking_model.booking_id), func.sum(booking_model.total_price)
+        ).filter(booking_model.user_id == user_id).group_by(booking_model.status):
+            counts[status] = counts.get(status, 0) + count
+            if status in crud.ACTIVE_BOOKING_STATUSES:
+                spent += Decimal(total)
+    next_trip = db.query(models.Booking.booking_id).join(models.Booking.travel_option).filter(
+        models.Booking.user_id == user_id,
+        models.Booking.status.in_(crud.ACTIVE_BOOKING_STATUSES),
+        models.TravelOption.departure_time >= datetime.now()
+    ).order_by(models.TravelOption.departure_time).first()
+
+    assert summary.total_bookings == sum(counts.values())
+    assert summary.active_bookings == counts.get("Pending", 0) + counts.get("Confirmed", 0)
+    assert summary.cancelled_bookings == counts.get("Cancelled", 0)
+    assert summary.failed_bookings == counts.get("Failed", 0)
+    assert summary.total_spent == spent
+    assert summary.next_booking_id == (next_trip.booking_id if next_trip else None)
+
+
+def test_summary_tracks_each_transition(db, user):
+    later = add_option(db, datetime.now() + timedelta(days=5))
+    sooner = add_option(db, datetime.now() + timedelta(days=2), price="750.00")
+    gateway = payments.FakePaymentGateway(latency=0)
+
+    first = book(db, user, later, seats=2)
+    assert_summary_matches_bookings(db, user.user_id)
+
+    second = book(db, user, sooner)
+    assert_summary_matches_bookings(db, user.user_id)
+    assert db.get(models.UserBookingSummary, user.user_id).next_booking_id == second.booking_id
+
+    # Pending -> Cancelled while its payment is still queued moves the next trip back
+    crud.cancel_booking(db, second.booking_id, user.user_id)
+    assert_summary_matches_bookings(db, user.user_id)
+
+    # Pending -> Confirmed through the payment worker
+    payments.process_job(db, payments.claim_next_job(db), gateway)
+    assert db.get(models.Booking, first.booking_id).status == "Confirmed"
+    assert_summary_matches_bookings(db, user.user_id)
+
+    # Pending -> Failed through the payment worker
+    third = book(db, user, sooner, seats=3)
+    payments.fail_payment(db, job_for(db, third), "declined")
+    assert_summary_matches_bookings(db, user.user_id)
+
+    # Confirmed -> Cancelled
+    crud.cancel_booking(db, first.booking_id, user.user_id)
+    assert_summary_matches_bookings(db, user.user_id)
+
+
+def test_summary_backfilled_on_first_access(db, user):
+    departed = add_option(db, datetime.now() - timedelta(days=3))
+    upcoming = add_option(db, datetime.now() + timedelta(days=3))
+    db.add(models.Booking(user_id=user.user_id, option_id=departed.option_id, num_seats=1,
+                          total_price=Decimal("1000.00"), status="Confirmed"))
+    db.commit()
+    archival.archive_departed_options(db)
+    booking = book(db, user, upcoming, seats=2)
+    book(db, user, upcoming)
+
+    # Existing users have no summary row until first use
+    db.query(models.UserBookingSummary).delete()
+    db.commit()
+    summary = crud.get_booking_summary(db, user.user_id)
+    assert summary.total_bookings == 3
+    assert summary.next_booking_id == booking.booking_id
+    assert_summary_matches_bookings(db, user.user_id)
+
+
+def test_summary_created_concurrently(session_factory, db, user):
+    option = add_option(db, datetime.now() + timedelta(days=1))
+    book(db, user, option)
+    db.query(models.UserBookingSummary).delete()
+    db.commit()
+
+    # Another request creates the row after this one found it missing
+    racing = session_factory()
+    get = racing.get
+    state = {"first": True}
+
+    def get_after_other_request(model, key, **kwargs):
+        if model is models.UserBookingSummary and state["first"]:
+            state["first"] = False
+            other = session_factory()
+            book(other, other.get(models.User, user.user_id), other.get(models.TravelOption, option.option_id))
+            other.close()
+            return None
+        return get(model, key, **kwargs)
+
+    racing.get = get_after_other_request
+    summary = crud.get_booking_summary(racing, user.user_id)
+    assert summary.total_bookings == 2
+    racing.close()
+    assert_summary_matches_bookings(db, user.user_id)
+
+
+def test_history_filters_and_pages_across_archive(db, user):
+    now = datetime.now()
+    departed = add_option(db, now - timedelta(days=3))
+    departed_id = departed.option_id
+    past = add_option(db, now - timedelta(hours=1))
+    upcoming = add_option(db, now + timedelta(days=3))
+
+    def add_booking(option, status, days_ago):
+        booking = models.Booking(user_id=user.user_id, option_id=option.option_id, num_seats=1,
+                                 total_price=Decimal("1000.00"), status=status,
+                                 booking_date=now - timedelta(days=days_ago))
+        db.add(booking)
+        db.commit()
+        return booking.booking_id
+
+    archived_confirmed = add_booking(departed, "Confirmed", 10)
+    archived_cancelled = add_booking(departed, "Cancelled", 9)
+    past_confirmed = add_booking(past, "Confirmed", 8)
+    upcoming_cancelled = add_booking(upcoming, "Cancelled", 7)
+    upcoming_confirmed = add_booking(upcoming, "Confirmed", 6)
+    upcoming_pending = add_booking(upcoming, "Pending", 5)
+    assert archival.archive_departed_options(db) == 1
+
+    def history(status_filter=None, skip=0, limit=100):
+        return [booking.booking_id for booking in crud.get_user_bookings(db, user.user_id, status_filter, skip, limit)]
+
+    newest_first = [upcoming_pending, upcoming_confirmed, upcoming_cancelled,
+                    past_confirmed, archived_cancelled, archived_confirmed]
+    assert history() == newest_first
+    assert history("upcoming") == [upcoming_pending, upcoming_confirmed]
+    assert history("past") == [past_confirmed, archived_confirmed]
+    assert history("cancelled") == [upcoming_cancelled, archived_cancelled]
+    assert history(skip=0, limit=4) + history(skip=4, limit=4) == newest_first
+    assert history(skip=3, limit=2) == [past_confirmed, archived_cancelled]
+
+    # Archived bookings come back with their archived travel option
+    archived = crud.get_user_bookings(db, user.user_id, "past")[-1]
+    assert isinstance(archived, models.ArchivedBooking)
+    assert archived.travel_option.option_id == departed_id
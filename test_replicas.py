@@ -0,0 +1,79 @@
+import sys
+import os
+import threading
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+import database
+from database import ReplicaRouter
+
+# SQLite files stand in for the primary and its replicas; a path in a missing
+# directory stands in for a replica that accepts no connections
+UNREACHABLE = "sqlite:////nonexistent-replica-dir/replica.db"
+
+
+def make_router(tmp_path, replica_urls):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    router = ReplicaRouter(primary, replica_urls)
+    router.check_health()
+    return router
+
+
+def test_reads_round_robin_over_replicas(tmp_path):
+    router = make_router(tmp_path, [f"sqlite:///{tmp_path / 'r1.db'}", f"sqlite:///{tmp_path / 'r2.db'}"])
+    engines = [router.read_engine() for _ in range(4)]
+    assert engines == router.replicas * 2
+    assert router.primary not in engines
+
+
+def test_no_replicas_reads_from_primary(tmp_path):
+    router = make_router(tmp_path, [])
+    assert router.read_engine() is router.primary
+    assert router.read_engine(user_id=1) is router.primary
+
+
+def test_unhealthy_replica_is_skipped(tmp_path):
+    router = make_router(tmp_path, [UNREACHABLE, f"sqlite:///{tmp_path / 'r1.db'}"])
+    assert {router.read_engine() for _ in range(4)} == {router.replicas[1]}
+    assert [replica["healthy"] for replica in router.status()] == [False, True]
+
+
+def test_falls_back_to_primary_when_all_replicas_down(tmp_path):
+    router = make_router(tmp_path, [UNREACHABLE])
+    assert router.read_engine() is router.primary
+
+
+def test_read_your_writes_pins_only_the_writer(tmp_path, monkeypatch):
+    router = make_router(tmp_path, [f"sqlite:///{tmp_path / 'r1.db'}"])
+    router.mark_write(7)
+    assert router.read_engine(user_id=7) is router.primary
+    assert router.read_engine(user_id=8) is router.replicas[0]
+    assert router.read_engine() is router.replicas[0]
+
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_SECONDS", 0.05)
+    router.mark_write(9)
+    time.sleep(0.1)
+    assert router.read_engine(user_id=9) is router.replicas[0]
+
+
+def test_concurrent_reads_share_one_health_check(tmp_path):
+    router = make_router(tmp_path, [f"sqlite:///{tmp_path / 'r1.db'}"])
+    calls = []
+    check_health = router.check_health
+
+    def slow_check_health():
+        calls.append(1)
+        time.sleep(0.2)
+        return check_health()
+
+    router.check_health = slow_check_health
+    router._last_check = 0.0  # Make the next read due for a check
+    threads = [threading.Thread(target=router.read_engine) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1